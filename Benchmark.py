@@ -0,0 +1,263 @@
+"""
+This file runs the solver over the bundled clue files (which hold the correct solutions) and measures speed and
+accuracy together: latency percentiles per clue type, peak memory, and how often the correct solution was the first
+solution (top-1) or one of the solutions (in-list).
+The results can be saved as a baseline and compared with later runs, so a change that makes the solver faster can be
+checked for accuracy regressions (and the other way around).
+"""
+
+
+import argparse
+import ClueSolver
+import Instrumentation
+import json
+import os
+import os.path
+import sys
+import time
+from SolveFromFile import FOLDER, parse_file, solve_clues
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak memory is not reported
+    resource = None
+
+CORPORA = ["ClueList.txt", "DifferentClues.txt", "DifferentClues2.txt", "DifferentClues3.txt"]
+BASELINE_FILE = os.path.join(FOLDER, "Benchmark_Baseline.json")
+PERCENTILES = [50, 90, 99]
+ALL_CLUES = "all clues"
+DEFAULT_TOLERANCE = 0.2
+
+
+def Benchmark(corpora=CORPORA, limit=None, workers=1, clue_workers=None):
+    """
+    Solves the clues in each of the given files (in the clues folder), at most limit clues per file.
+    If clue_workers is given, the clues are solved one at a time, and the subproblems of each clue are solved in
+    parallel by that many worker processes (see ClueSolver.get_executor), so the latencies show the speedup of a single
+    clue over the number of CPUs.
+    :return: A dictionary from the name of each file to its results (see _run_corpus), and the peak memory of the
+    run in megabytes (None if it can't be measured).
+    """
+    Instrumentation.enable()
+    executor = ClueSolver.get_executor(clue_workers) if clue_workers else None
+    results = {}
+    for corpus in corpora:
+        print("Solving clues in file %s" % corpus, file=sys.stderr)
+        with open(os.path.join(FOLDER, corpus), "r", encoding="utf-8") as f:
+            results[corpus] = _run_corpus(_take(parse_file(f), limit), workers, executor)
+
+    return results, _get_peak_memory()
+
+
+def _run_corpus(clues, workers, executor=None):
+    """
+    Solves the given clues and returns their results
+    """
+    latencies = {ALL_CLUES: []}
+    num_of_clues = 0
+    top_1 = 0
+    in_list = 0
+    start = time.perf_counter()
+
+    solved = solve_clues(clues, workers) if executor is None else _solve_with_executor(clues, executor)
+    for clue, solution_format, solution, solutions in solved:
+        num_of_clues += 1
+        words = [_normalize(word) for word, score in solutions]
+        if words and words[0] == _normalize(solution):
+            top_1 += 1
+        if _normalize(solution) in words:
+            in_list += 1
+
+        for record in Instrumentation.take_records():
+            latencies[ALL_CLUES].append(record["time"])
+            for clue_type, type_record in record["types"].items():
+                latencies.setdefault(clue_type, []).append(type_record["time"])
+
+    return {"clues": num_of_clues,
+            "top_1": top_1,
+            "in_list": in_list,
+            "total_time": time.perf_counter() - start,
+            "latency": {clue_type: _get_percentiles(times) for clue_type, times in latencies.items()}}
+
+
+def _solve_with_executor(clues, executor):
+    """
+    Generator that solves the given clues one at a time, with the subproblems of each clue solved in parallel by the
+    executor, and yields each clue with its list of solutions
+    """
+    for clue, solution_format, solution in clues:
+        yield clue, solution_format, solution, ClueSolver.solve(clue, solution_format, executor)
+
+
+def _take(clues, limit):
+    """
+    Generator that yields at most limit of the clues (all of them if limit is None)
+    """
+    for i, clue in enumerate(clues):
+        if limit is not None and i >= limit:
+            return
+        yield clue
+
+
+def _normalize(solution):
+    """
+    Solutions are compared without spaces, as some clue files write multi-word solutions without them
+    """
+    return solution.replace(" ", "").replace("_", "")
+
+
+def _get_percentiles(times):
+    """
+    Returns a dictionary of the percentiles (and the maximum) of the given times, using the nearest-rank method
+    """
+    times = sorted(times)
+    percentiles = {}
+    for percentile in PERCENTILES:
+        rank = max(int(-(-percentile * len(times) // 100)), 1)      # ceiling of percentile% of the number of times
+        percentiles["p%s" % percentile] = times[rank - 1] if times else 0.0
+    percentiles["max"] = times[-1] if times else 0.0
+    return percentiles
+
+
+def _get_peak_memory():
+    """
+    Returns the peak resident memory of this process and its (finished) worker processes in megabytes, or None if it
+    can't be measured on this platform
+    """
+    if resource is None:
+        return None
+
+    # The peak is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * unit / 2 ** 20
+
+
+def print_results(results, peak_memory, baseline=None, f=sys.stdout):
+    """
+    Prints the results of a run as a table per clue file, with the change from the baseline results (if given)
+    """
+    baseline_results = baseline["results"] if baseline is not None else {}
+    for corpus, corpus_results in results.items():
+        old = baseline_results.get(corpus)
+        clues = corpus_results["clues"]
+        print("%s: %s clues in %.1f seconds%s" % (corpus, clues, corpus_results["total_time"],
+                                                  _change(corpus_results["total_time"], old and old["total_time"])),
+              file=f)
+        for name in ["top_1", "in_list"]:
+            print("  %-8s %5s (%.1f%%)%s" % (name, corpus_results[name], _percent(corpus_results[name], clues),
+                                             _change(corpus_results[name], old and old[name])), file=f)
+
+        print("  %-30s %10s %10s %10s %10s" % ("Latency (s)", *["p%s" % p for p in PERCENTILES], "max"), file=f)
+        for clue_type, percentiles in sorted(corpus_results["latency"].items(), key=lambda item: item[0] != ALL_CLUES):
+            old_percentiles = old["latency"].get(clue_type) if old else None
+            print("  %-30s %s" % (clue_type, " ".join("%10.3f" % percentiles[name] for name in percentiles)), file=f)
+            if old_percentiles:
+                print("  %-30s %s" % ("  (baseline)", " ".join("%10.3f" % old_percentiles[name]
+                                                                for name in percentiles)), file=f)
+        print(file=f)
+
+    if peak_memory is not None:
+        old_memory = baseline and baseline["peak_memory"]
+        print("Peak memory: %.1f MB%s" % (peak_memory, _change(peak_memory, old_memory)), file=f)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares the results of a run with the baseline results of the same clue files.
+    :return: A list of descriptions of the regressions: any drop in accuracy, and any latency percentile (of all the
+    clues) that grew by more than the tolerance (a fraction of the baseline latency).
+    """
+    regressions = []
+    for corpus, corpus_results in results.items():
+        old = baseline["results"].get(corpus)
+        if old is None:
+            continue
+        if old["clues"] != corpus_results["clues"]:
+            regressions.append("%s: baseline has %s clues, this run has %s" % (corpus, old["clues"],
+                                                                              corpus_results["clues"]))
+            continue
+
+        for name in ["top_1", "in_list"]:
+            if corpus_results[name] < old[name]:
+                regressions.append("%s: %s dropped from %s to %s" % (corpus, name, old[name], corpus_results[name]))
+
+        for name, latency in corpus_results["latency"][ALL_CLUES].items():
+            old_latency = old["latency"][ALL_CLUES][name]
+            if latency > old_latency * (1 + tolerance):
+                regressions.append("%s: %s latency grew from %.3f to %.3f seconds" % (corpus, name, old_latency,
+                                                                                     latency))
+
+    return regressions
+
+
+def load_baseline(path=BASELINE_FILE):
+    """
+    Returns the baseline saved in the given file, or None if there is none
+    """
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results, peak_memory, path=BASELINE_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "peak_memory": peak_memory}, f, indent=2, sort_keys=True)
+
+
+def _change(value, old_value):
+    """
+    Returns a description of the relative change from the old value (empty if there is no old value)
+    """
+    if not old_value:
+        return ""
+
+    return " (baseline %.4g, %+.1f%%)" % (old_value, 100 * (value - old_value) / old_value)
+
+
+def _percent(part, total):
+    return 100 * part / total if total > 0 else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the speed and accuracy of the solver on the clue files, "
+                                                 "and compares them with a saved baseline.")
+    parser.add_argument("corpora", nargs="*", default=CORPORA,
+                        help="clue files in the %s folder to solve (default: all of them)" % FOLDER)
+    parser.add_argument("--limit", type=int,
+                        help="solve only the first LIMIT clues of each file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes to solve clues in parallel (default: 1)")
+    parser.add_argument("--clue-workers", type=int,
+                        help="solve the subproblems of each clue in parallel with this number of worker processes "
+                             "(to measure the speedup of a single clue)")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help="baseline file to compare with (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save the results of this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="fraction by which latencies may grow before they count as a regression "
+                             "(default: %(default)s)")
+    args = parser.parse_args()
+
+    results, peak_memory = Benchmark(args.corpora, args.limit, args.workers, args.clue_workers)
+    baseline = load_baseline(args.baseline)
+    print_results(results, peak_memory, baseline)
+
+    if args.save_baseline:
+        save_baseline(results, peak_memory, args.baseline)
+        print("Saved the results as the baseline in %s" % args.baseline)
+    elif baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression: %s" % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
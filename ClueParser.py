@@ -0,0 +1,155 @@
+"""
+This file holds a parser made for the shape of the clue grammar in GrammarDefinitions, which finds the subproblems of a
+clue (see ClueSolver.get_subproblem) without building a chart or parse trees.
+Every clue type of the grammar splits the clue into a definition (SYN) and a wordplay part, with an optional EQU part
+between them. The wordplay part is an indicator next to a fodder (anagram, reversal and hidden word clues) or an
+indicator between two fodders (enclosure and insertion clues). The parser enumerates these spans directly, using the
+indicators and abbreviations found in the clue by the Lexicon's PhraseMatcher.
+It finds the same subproblems as solving the parse trees of the grammar (with every choice of abbreviations) would.
+"""
+
+
+import Instrumentation
+import Lexicon
+from GrammarDefinitions import IDENTIFIER_TYPES
+
+# The indicator of each clue type, and whether its fodder can have abbreviations
+INDICATORS = {"ANAG": "ANAG_IDT", "REVERSE": "REV_IDT", "ENCLOSE": "ENC_IDT", "INSERT": "INS_IDT", "HIDDEN": "HID_IDT"}
+ABBREVIATED_TYPES = {"REVERSE", "ENCLOSE", "INSERT"}
+
+
+def parse(clue):
+    """
+    Returns a list of the distinct subproblems of the clue (a list of words), in the order of the clue types in the
+    grammar.
+    Each way to split the clue stands for one parse tree of the grammar (with one choice of abbreviations), so the ways
+    that repeat a subproblem are counted as trees_collapsed, like the parse trees that have the same subproblem.
+    """
+    subproblems = list(_ClueSpans(clue).subproblems())
+    distinct = list(dict.fromkeys(subproblems))
+    Instrumentation.count("trees_collapsed", len(subproblems) - len(distinct))
+    return distinct
+
+
+class _ClueSpans:
+    """
+    Object that enumerates the ways to split a single clue into the parts of each clue type
+    """
+
+    def __init__(self, clue):
+        self.clue = clue
+        matches = Lexicon.get_matcher(IDENTIFIER_TYPES + [Lexicon.ABBREVIATIONS]).find(clue)
+
+        # name -> the (start, end) spans of the clue that match an entry of its list
+        self.spans = {name: [] for name in IDENTIFIER_TYPES + [Lexicon.ABBREVIATIONS]}
+        for start, end, name in matches:
+            self.spans[name].append((start, end))
+
+        # start -> (end, abbreviations) of each abbreviated word or phrase that starts there
+        abbreviations = Lexicon.get_abbreviations()
+        self.abbreviations = {}
+        for start, end in self.spans[Lexicon.ABBREVIATIONS]:
+            self.abbreviations.setdefault(start, []).append((end, abbreviations[" ".join(clue[start:end])]))
+
+        self._chains = {}
+
+    def subproblems(self):
+        """
+        Generator of the subproblems of all clue types (with repetitions)
+        """
+        n = len(self.clue)
+
+        # DOUBLE_SYN -> SYN EQU SYN | SYN SYN (the second synonym comes first in the subproblem)
+        for first_end, second_start in self._splits(0, n):
+            yield "DOUBLE_SYN", self._sentence(second_start, n), self._sentence(0, first_end)
+
+        for clue_type, indicator in INDICATORS.items():
+            if not self.spans[indicator]:
+                continue
+
+            # TYPE -> SYN EQU TYPE_SEN | SYN TYPE_SEN | TYPE_SEN EQU SYN | TYPE_SEN SYN
+            for syn_end, start in self._splits(0, n):
+                for fodder in self._fodders(clue_type, start, n):
+                    yield (clue_type,) + fodder + (self._sentence(0, syn_end),)
+            for end, syn_start in self._splits(0, n):
+                for fodder in self._fodders(clue_type, 0, end):
+                    yield (clue_type,) + fodder + (self._sentence(syn_start, n),)
+
+    def _splits(self, start, end):
+        """
+        Generator of the ways to split the span into two non-empty parts, with or without an EQU part between them:
+        yields the end of the first part and the start of the second part
+        """
+        for middle in range(start + 1, end):
+            yield middle, middle
+        for equ_start, equ_end in self.spans["EQU"]:
+            if start < equ_start and equ_end < end:
+                yield equ_start, equ_end
+
+    def _fodders(self, clue_type, start, end):
+        """
+        Generator of the fodders of the wordplay part of the given clue type, if it is the given span: tuples of the
+        anagramed (or reversed, or hiding) words, or of the enclosing and inserted words
+        """
+        indicators = self.spans[INDICATORS[clue_type]]
+        if clue_type in ["ENCLOSE", "INSERT"]:
+            # ENC_SEN -> ENC_WORD ENC_IDT INS_WORD and INS_SEN -> INS_WORD INS_IDT ENC_WORD
+            for indicator_start, indicator_end in indicators:
+                if start < indicator_start and indicator_end < end:
+                    for first in self._chain(start, indicator_start):
+                        for second in self._chain(indicator_end, end):
+                            yield (first, second) if clue_type == "ENCLOSE" else (second, first)
+            return
+
+        # TYPE_SEN -> TYPE_IDT TYPE_WORD | TYPE_WORD TYPE_IDT
+        abbreviated = clue_type in ABBREVIATED_TYPES
+        for indicator_start, indicator_end in indicators:
+            if indicator_start == start and indicator_end < end:
+                fodder_start, fodder_end = indicator_end, end
+            elif indicator_end == end and start < indicator_start:
+                fodder_start, fodder_end = start, indicator_start
+            else:
+                continue
+
+            if abbreviated:
+                for fodder in self._chain(fodder_start, fodder_end):
+                    yield fodder,
+            else:
+                yield "".join(self.clue[fodder_start:fodder_end]),
+
+    def _chain(self, start, end):
+        """
+        Returns the strings a chain of words (WORDABBR -> WORD | ABBR) over the span can stand for: the words written
+        together, with any abbreviated word or phrase replaced by one of its abbreviations
+        """
+        if (start, end) not in self._chains:
+            if start == end:
+                strings = [""]
+            else:
+                strings = [self.clue[start] + rest for rest in self._chain(start + 1, end)]
+                for abbreviation_end, abbreviations in self.abbreviations.get(start, []):
+                    if abbreviation_end <= end:
+                        strings += [abbreviation + rest for abbreviation in abbreviations
+                                    for rest in self._chain(abbreviation_end, end)]
+            self._chains[start, end] = list(dict.fromkeys(strings))
+
+        return self._chains[start, end]
+
+    def _sentence(self, start, end):
+        return " ".join(self.clue[start:end])
+
+
+if __name__ == "__main__":
+    # Checks that the parser finds the same subproblems as the parse trees of the grammar, for all the clues in a file
+    import ClueSolver
+    import sys
+    from SolveFromFile import parse_file
+
+    file_name = sys.argv[1] if len(sys.argv) > 1 else "Clues/ClueList.txt"
+    with open(file_name, encoding="utf-8") as f:
+        clues = [clue for clue, _, _ in parse_file(f)]
+
+    different = [clue for clue in clues if set(parse(clue)) != set(ClueSolver.get_tree_subproblems(clue))]
+    for clue in different:
+        print("Different subproblems: %s" % " ".join(clue))
+    print("%s of %s clues have the same subproblems as their parse trees" % (len(clues) - len(different), len(clues)))
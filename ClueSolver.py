@@ -1,76 +1,395 @@
-import itertools
+import ClueParser
+import concurrent.futures
+import glob
 import GrammarDefinitions
-import nltk
-import os.path
+import Instrumentation
+import itertools
+import LemmaIndex
+import Lexicon
+import math
+import multiprocessing
+import multiprocessing.util
+import os
+import SimilarityEngine
 import SimilaritySolver
+import time
 
-ANAG_MAX = 9
 MIN_SOLUTION_VALUE = 0
+MAX_ANAGRAM_PHRASES = 100
+# The walk for the phrases of a multi-word anagram stops at this number of phrases (which are then ranked, see
+# _solve_anagram) or of visited trie nodes, since long fodder has millions of phrases
+MAX_WALKED_PHRASES = 20 * MAX_ANAGRAM_PHRASES
+MAX_ANAGRAM_NODES = 200000
+UNKNOWN_PHRASE_FACTOR = 0.5     # phrases WordNet doesn't know are less likely solutions than ones it knows
+
+# Rough times (in milliseconds, see _estimate_cost) of preparing the definition of a clue for scoring, of scoring a
+# single candidate solution, and of finding and scoring the candidates of a double synonym (when every lemma fits the
+# format). Without a format, a double synonym searches all the lemmas, which takes UNKNOWN_FORMAT_COST times longer.
+CONTEXT_COST = 0.3
+CANDIDATE_COST = 0.1
+NODE_COST = 0.002   # of visiting a node of the letter trie, when walking the phrases of a multi-word anagram
+DOUBLE_SYN_COST = 40
+UNKNOWN_FORMAT_COST = 1.3
+
+# Number of clues that can be cancelled at the same time (see Cancellation), and the number of candidates scored between
+# checks for cancellation
+CANCEL_SLOTS = 1024
+SCORE_CHUNK_SIZE = 100
+
+_executor = None
+_cancellation = None    # of the pool of worker processes that this process owns or belongs to
+_job = None             # the job of the subproblem that this worker process is solving
+
+
+class Cancelled(Exception):
+    """
+    Raised in a worker process when the clue whose subproblem it's solving was cancelled
+    """
+
+
+class Cancellation:
+    """
+    Object that a process shares with its pool of worker processes (see init_worker), so it can stop the subproblems
+    of a clue that were already sent to the workers (cancelling their futures only drops the ones that weren't).
+    The subproblems of each clue are sent as one job (see new_job). Cancelling the job marks it in shared memory, and
+    the workers check the mark when they start a subproblem and between chunks of candidates (see check_cancelled).
+    """
+
+    def __init__(self, slots=CANCEL_SLOTS):
+        # The job that was last cancelled in each slot (jobs start at 1, so no job is cancelled at first)
+        self._cancelled = multiprocessing.Array("q", slots, lock=False)
+        self._last_job = 0
+
+    def new_job(self):
+        """
+        Returns the number of a new job
+        """
+        self._last_job += 1
+        return self._last_job
+
+    def cancel(self, job):
+        self._cancelled[job % len(self._cancelled)] = job
+
+    def is_cancelled(self, job):
+        return self._cancelled[job % len(self._cancelled)] == job
 
 
-def solve(clue, solution_format):
+def solve(clue, solution_format, executor=None):
     """
     The main function that finds all solutions for a single clue.
     Uses parser to find all possible parse trees, then calls the solving function for each parsing tree according to its
-    clue type. Returns an ordered list of all possible solutions with score > MIN_SOLUTION VALUE
+    clue type. Returns an ordered list of all possible solutions with score > MIN_SOLUTION VALUE.
+    If an executor (see get_executor) is given, the parse trees are solved in parallel by its worker processes.
     """
-    # Define parser
-    grammar_str = GrammarDefinitions.define_grammar(clue)
-    grammar = nltk.CFG.fromstring(grammar_str)
-    parser = nltk.ChartParser(grammar)
+    return solve_with_budget(clue, solution_format, executor=executor)[0]
 
-    solutions = []
 
-    # Get all possible solutions
-    for tree in parser.parse(clue):
-        _handle_abbreviations(tree)
-        type = tree[0].label()
-        solutions += SOLVER_DICT[type](tree[0], solution_format)
-
-    # Filter only relevant solutions
+def solve_with_budget(clue, solution_format, time_budget=None, candidate_budget=None, executor=None, stop_score=None):
+    """
+    Finds the solutions for a single clue like solve, but stops when the budgets run out (see solve_iter).
+    Returns the ordered list of the solutions found, and whether all the subproblems of the clue were solved (if not,
+    solve may find other solutions).
+    """
+    results = sorted(_solve_subproblems(clue, solution_format, time_budget, candidate_budget, executor, stop_score),
+                     key=lambda result: result[0])
+    solutions = [solution for _, subproblem_solutions, _ in results for solution in subproblem_solutions]
     solutions.sort(key=lambda x: x[1], reverse=True)
-    solutions = [solution for solution in solutions if solution[1] > MIN_SOLUTION_VALUE and solution[0] not in clue]
 
-    return solutions
+    # A clue without subproblems counts as cut (it's solved again), since the budget may run out before any is solved
+    complete = len(results) > 0 and len(results) == results[0][2]
+    return solutions, complete
 
 
-def _solve_double_synonym(parse_tree, solution_format=None):
+def solve_iter(clue, solution_format, time_budget=None, candidate_budget=None, executor=None, stop_score=None):
     """
-    Solver for double synonym clues
+    Generator that finds the solutions for a single clue and yields them as soon as they are found (not sorted).
+    The clue is reduced to its distinct subproblems (see get_subproblems), and each is solved once, from the cheapest to
+    the most expensive (see _estimate_cost), so the solutions of cheap clue types come first.
+    If a time budget (in seconds) or a candidate budget (number of solutions) is given, the search stops when it runs
+    out. If a stop score is given, it also stops as soon as a solution with at least that score is found (the scores
+    of the clue types aren't on the same scale, so only a score that no wrong solution reaches should be used). The
+    budgets and the stop score are checked between subproblems, so the subproblem being solved is always finished.
+    If an executor (see get_executor) is given, all the subproblems are solved in parallel by its worker processes,
+    and the solutions of each are yielded when it's done. The time budget then also stops waiting for a subproblem.
+    Only solutions with score > MIN_SOLUTION_VALUE are yielded.
     """
-    def _get_value(solution_list, word):
-        # Gets the value of a word in a solution list
-        for solution in solution_list:
-            if solution[0] == word:
-                return solution[1]
+    for _, solutions, _ in _solve_subproblems(clue, solution_format, time_budget, candidate_budget, executor,
+                                              stop_score):
+        yield from solutions
 
-        return 0
 
-    # Get the two synonym parts
-    first_syn, second_syn = _get_parts_ignore_EQU(parse_tree)
-    first_syn = _create_sentence(first_syn)
-    second_syn = _create_sentence(second_syn)
+def get_executor(workers=None):
+    """
+    Returns the pool of worker processes that solve the subproblems of a clue in parallel (by default, one per CPU).
+    The pool is started on first use, and the workers load everything the solvers need right away, so they are ready by
+    the time the first clue is parsed. Everything is loaded (and any missing index is built) in this process first, so
+    the workers don't build the same index at the same time.
+    """
+    global _executor, _cancellation
+    if _executor is None:
+        workers = workers or os.cpu_count()
+        warm_up()
+        _cancellation = Cancellation()
+        _executor = concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_executor_worker,
+                                                           initargs=(_cancellation,))
+        for _ in range(workers):
+            _executor.submit(os.getpid)
 
-    # Get top 1000 matching scores for each part of the clue
-    if solution_format is not None:
-        first_solutions = SimilaritySolver.solve(first_syn, length=solution_format.get_total_length(spaces=True))
-        second_solutions = SimilaritySolver.solve(second_syn, length=solution_format.get_total_length(spaces=True))
-        second_words = [word for word, _ in second_solutions if solution_format.check(word)]
+    return _executor
+
+
+def _init_executor_worker(cancellation):
+    """
+    Initializes a worker process of the executor: loads everything the solvers need, and keeps the executor's
+    Cancellation
+    """
+    global _cancellation
+    _cancellation = cancellation
+    warm_up()
+
+
+def init_worker(instrument=False, cancellation=None):
+    """
+    Initializes a worker process of a pool that solves clues (see SolveFromFile and SolverService): loads WordNet, the
+    grammar and the indexes once, and makes the worker save its path similarity cache when it exits.
+    If the pool's Cancellation is given, the worker stops solving the subproblems of cancelled jobs (see
+    solve_relevant).
+    """
+    global _cancellation
+    _cancellation = cancellation
+    if instrument:
+        Instrumentation.enable()
+    warm_up()
+    SimilaritySolver.load_path_cache()
+    multiprocessing.util.Finalize(None, SimilaritySolver.save_path_cache, args=(_get_worker_cache_path(os.getpid()),),
+                                  exitpriority=10)
+
+
+def merge_worker_caches():
+    """
+    Adds the path similarity caches saved by the worker processes (see init_worker) to the cache of this process
+    """
+    for path in glob.glob(_get_worker_cache_path("*")):
+        SimilaritySolver.load_path_cache(path)
+        os.remove(path)
+
+
+def _get_worker_cache_path(pid):
+    return "%s.worker%s" % (SimilaritySolver.PATH_CACHE_FILE, pid)
+
+
+def _solve_subproblems(clue, solution_format, time_budget=None, candidate_budget=None, executor=None,
+                       stop_score=None):
+    """
+    Generator that parses the clue, solves its subproblems and yields the position of each subproblem (in the order of
+    get_subproblems) with its relevant solutions and the number of subproblems, until the budgets run out (see
+    solve_iter)
+    """
+    Instrumentation.start_clue(clue)
+    start = time.perf_counter()
+    try:
+        subproblems = get_subproblems(clue, solution_format)
+        if executor is None:
+            results = _solve_in_order(subproblems, clue, solution_format)
+        else:
+            deadline = start + time_budget if time_budget is not None else None
+            results = _solve_in_parallel(subproblems, clue, solution_format, executor, deadline)
+
+        num_solved = 0
+        num_of_solutions = 0
+        try:
+            for i, solutions in results:
+                yield i, solutions, len(subproblems)
+                num_solved += 1
+                num_of_solutions += len(solutions)
+
+                if ((stop_score is not None and any(score >= stop_score for _, score in solutions)) or
+                        (time_budget is not None and time.perf_counter() - start >= time_budget) or
+                        (candidate_budget is not None and num_of_solutions >= candidate_budget)):
+                    break
+        finally:
+            results.close()
+
+        if num_solved < len(subproblems):
+            Instrumentation.count("subproblems_skipped", len(subproblems) - num_solved)
+    finally:
+        Instrumentation.end_clue()
+
+
+def _solve_in_order(subproblems, clue, solution_format):
+    """
+    Generator that solves the subproblems one after the other, and yields the position and relevant solutions of each
+    """
+    for i, subproblem in enumerate(subproblems):
+        with Instrumentation.stage("solve", clue_type=subproblem[0]):
+            solutions = filter_solutions(solve_subproblem(subproblem, solution_format), clue)
+        yield i, solutions
+
+
+def _solve_in_parallel(subproblems, clue, solution_format, executor, deadline=None):
+    """
+    Generator that sends all the subproblems to the worker processes of the executor (cheapest first), and yields the
+    position and relevant solutions of each subproblem as soon as it's solved. It stops waiting at the deadline (a
+    time.perf_counter time), if given. When it stops, the subproblems that no worker started yet are cancelled, and if
+    the executor is the one of get_executor, the workers stop the ones they already started (see Cancellation).
+    The time spent solving is not instrumented, as it's spent in other processes.
+    """
+    cancellation = _cancellation if executor is _executor else None
+    job = cancellation.new_job() if cancellation is not None else None
+    futures = {executor.submit(solve_relevant, subproblem, solution_format, clue, job): i
+               for i, subproblem in enumerate(subproblems)}
+    timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+    try:
+        for future in concurrent.futures.as_completed(futures, timeout):
+            yield futures[future], future.result()
+    except concurrent.futures.TimeoutError:
+        return
+    finally:
+        for future in futures:
+            future.cancel()
+        if job is not None:
+            cancellation.cancel(job)
+
+
+def solve_relevant(subproblem, solution_format, clue, job=None):
+    """
+    Solves a single subproblem (in a worker process) and returns its relevant solutions.
+    If the number of a job of the worker's Cancellation is given, Cancelled is raised as soon as the job is cancelled.
+    """
+    global _job
+    _job = job
+    try:
+        check_cancelled()
+        return filter_solutions(solve_subproblem(subproblem, solution_format), clue)
+    finally:
+        _job = None
+
+
+def check_cancelled():
+    """
+    Raises Cancelled if the job of the subproblem being solved in this worker process was cancelled
+    """
+    if _job is not None and _cancellation is not None and _cancellation.is_cancelled(_job):
+        raise Cancelled()
+
+
+def get_subproblems(clue, solution_format):
+    """
+    Parses the clue and returns the distinct subproblems of its parse trees (see get_subproblem), from the cheapest to
+    the most expensive to solve.
+    The subproblems are found by ClueParser, which enumerates the parts of the clue directly rather than building the
+    parse trees of the grammar, and finds the same subproblems (trees that differ only in their structure have the same
+    subproblem, which is solved only once).
+    """
+    with Instrumentation.stage("parse"):
+        subproblems = ClueParser.parse(clue)
+    Instrumentation.count("subproblems", len(subproblems))
+    subproblems.sort(key=lambda subproblem: _estimate_cost(subproblem, solution_format))
+
+    return subproblems
+
+
+def filter_solutions(solutions, clue):
+    """
+    Returns only the relevant solutions: the ones with score > MIN_SOLUTION_VALUE that are not words of the clue itself
+    """
+    return [solution for solution in solutions if solution[1] > MIN_SOLUTION_VALUE and solution[0] not in clue]
+
+
+def _estimate_cost(subproblem, solution_format):
+    """
+    Returns a rough estimate of the time (in milliseconds) it takes to solve the given subproblem, from the number of
+    candidate solutions it scores. The number depends on the length of the fodder, and, if the format is given, on
+    whether the fodder fits it (a fodder of the wrong length has no candidates at all).
+    """
+    clue_type = subproblem[0]
+    if clue_type == "DOUBLE_SYN":
+        # The candidates are the nearest lemmas that fit the format (at most DOUBLE_CANDIDATES of them)
+        if solution_format is None:
+            return DOUBLE_SYN_COST * UNKNOWN_FORMAT_COST
+        lemmas = len(SimilarityEngine.get_engine().lemma_ids(pattern=solution_format.lengths))
+        return DOUBLE_SYN_COST * (1 + min(lemmas / SimilaritySolver.DOUBLE_CANDIDATES, 1)) / 2
+
+    fodder = subproblem[1]
+    if clue_type in ["ENCLOSE", "INSERT"]:
+        length = len(subproblem[1]) + len(subproblem[2])
     else:
-        first_solutions = SimilaritySolver.solve(first_syn)
-        second_solutions = SimilaritySolver.solve(second_syn)
-        second_words = [word for word, _ in second_solutions]
+        length = len(fodder)
+    if solution_format is not None and length != solution_format.get_total_length() and clue_type != "HIDDEN":
+        return 0
 
-    # Combine both lists, with the value being the product of the value for eac syn part
-    solutions = [(solution[0], _get_value(second_solutions, solution[0]) * solution[1]) for
-                 solution in first_solutions if solution[0] in second_words]
+    if clue_type == "ANAG":
+        # The WordNet words made of the letters, and the phrases of several words: the walk for them grows with the
+        # number of ways to order the distinct letters (up to MAX_ANAGRAM_NODES), and at most MAX_ANAGRAM_PHRASES of
+        # them are scored (with their words)
+        candidates = len(LemmaIndex.anagrams(fodder))
+        if solution_format is not None and solution_format.num_of_words > 1:
+            orders = math.factorial(len(set(fodder)))
+            candidates += 2 * min(orders, MAX_ANAGRAM_PHRASES)
+            return CONTEXT_COST + CANDIDATE_COST * candidates + NODE_COST * min(orders, MAX_ANAGRAM_NODES)
+    elif clue_type == "REVERSE":
+        candidates = 1
+    elif clue_type == "HIDDEN":
+        if solution_format is not None:
+            candidates = max(length - solution_format.get_total_length() + 1, 0)
+        else:
+            candidates = (length - 1) * (length + 2) // 2   # the substrings of every length shorter than the fodder
+    else:
+        candidates = len(fodder) - 1    # the positions of the inserted word in the enclosing word
 
-    return solutions
+    return CONTEXT_COST + CANDIDATE_COST * candidates if candidates > 0 else 0
 
 
-def _solve_anagram(parse_tree, solution_format=None):
+def warm_up():
     """
-    Solver for anagram clues
+    Loads everything the solvers need (WordNet, the word lists and their matcher, and the indexes), so it isn't loaded
+    while solving the first clue
+    """
+    Lexicon.get_matcher(GrammarDefinitions.IDENTIFIER_TYPES + [Lexicon.ABBREVIATIONS])
+    Lexicon.get_abbreviations()
+    LemmaIndex.get_anagram_index()
+    LemmaIndex.get_trie()
+    SimilaritySolver.warm_up()
+
+
+def get_subproblem(parse_tree):
+    """
+    Returns the canonical subproblem of a parse tree (without abbreviations, see _handle_abbreviations): a tuple of its
+    clue type and the strings that the solver of this type needs (the fodder and the definition).
+    Trees that only differ in how their word chains are bracketed or where the EQU part is have the same subproblem.
+    """
+    type = parse_tree.label()
+    return (type,) + EXTRACTOR_DICT[type](parse_tree)
+
+
+def get_tree_subproblems(clue):
+    """
+    Returns the distinct subproblems of the parse trees of the clue in its grammar (with every choice of abbreviations).
+    ClueParser finds the same subproblems much faster, so this is only used to check the parser against the grammar.
+    """
+    trees = GrammarDefinitions.get_parser(clue).parse(clue)
+    return list(dict.fromkeys(get_subproblem(abbreviated_tree[0])
+                              for tree in trees for abbreviated_tree in _handle_abbreviations(tree)))
+
+
+def solve_subproblem(subproblem, solution_format=None):
+    """
+    Finds the solutions of a subproblem (see get_subproblem) with the solver of its clue type
+    """
+    return SOLVER_DICT[subproblem[0]](*subproblem[1:], solution_format)
+
+
+def _extract_double_synonym(parse_tree):
+    """
+    Returns the two synonym parts of a double synonym tree
+    """
+    first_syn, second_syn = _get_parts_ignore_EQU(parse_tree)
+    return _create_sentence(first_syn), _create_sentence(second_syn)
+
+
+def _extract_anagram(parse_tree):
+    """
+    Returns the anagramed word and the synonym part of an anagram tree
     """
     anag, syn = _get_parts_ignore_EQU(parse_tree)
 
@@ -78,27 +397,13 @@ def _solve_anagram(parse_tree, solution_format=None):
     anag_word = anag[0]
     if not anag_word.label() == 'ANAG_WORD':
         anag_word = anag[1]
-    anag_word = _create_sentence(anag_word, space=False)
-
-    syn_sent = _create_sentence(syn)
-    if len(anag_word) > ANAG_MAX:
-        # If anagram is too long, ignore it
-        return []
 
-    # Get all possible permutations and filter with solution_format (if given)
-    words = ["".join(perm) for perm in itertools.permutations(anag_word)]
-    if solution_format is not None:
-        words = [solution_format.add_spaces(word) for word in words if solution_format.check(word)]
-
-    # Calculate match score for all possible solutions
-    solutions = [(word, SimilaritySolver.solve(syn_sent, 0, word.replace(" ", "_"))) for word in words]
-
-    return solutions
+    return _create_sentence(anag_word, space=False), _create_sentence(syn)
 
 
-def _solve_reverse(parse_tree, solution_format=None):
+def _extract_reverse(parse_tree):
     """
-    Solver for reversal clues
+    Returns the word to reverse and the synonym part of a reversal tree
     """
     reverse, syn = _get_parts_ignore_EQU(parse_tree)
 
@@ -107,99 +412,202 @@ def _solve_reverse(parse_tree, solution_format=None):
     if not reverse_word.label() == 'REV_WORD':
         reverse_word = reverse[1]
 
-    reverse_word = _create_sentence(reverse_word, space=False, abbr=True)
+    return _create_sentence(reverse_word, space=False, abbr=True), _create_sentence(syn)
 
-    # Reverse the word and check if it fits format (if given)
-    reversed = reverse_word[::-1]
-    if solution_format is not None:
-        if not solution_format.check(reversed):
-            return []
-        reversed = solution_format.add_spaces(reversed)
 
-    # Calculate match score
-    syn_sent = _create_sentence(syn)
-    return [(reversed, SimilaritySolver.solve(syn_sent, 0, reversed.replace(" ", "_")))]
-
-
-def _solve_enclosure(parse_tree, solution_format=None):
+def _extract_enclosure(parse_tree):
     """
-    Solver for enclosure clues
+    Returns the enclosing word, the inserted word and the synonym part of an enclosure tree
     """
     enclose, syn = _get_parts_ignore_EQU(parse_tree)
 
     # Get enclosing and inserted words
-    enc_word = enclose[0]
-    ins_word = enclose[2]
-    enc_word = _create_sentence(enc_word, space=False, abbr=True)
-    ins_word = _create_sentence(ins_word, space=False, abbr=True)
+    enc_word = _create_sentence(enclose[0], space=False, abbr=True)
+    ins_word = _create_sentence(enclose[2], space=False, abbr=True)
 
-    syn_sent = _create_sentence(syn)
+    return enc_word, ins_word, _create_sentence(syn)
 
-    return _get_all_insertions(syn_sent, enc_word, ins_word, solution_format)
 
-
-def _solve_insertion(parse_tree, solution_format=None):
+def _extract_insertion(parse_tree):
     """
-    Solver for insertion clues
+    Returns the enclosing word, the inserted word and the synonym part of an insertion tree
     """
     insert, syn = _get_parts_ignore_EQU(parse_tree)
 
     # Get inserted and enclosing words
-    ins_word = insert[0]
-    enc_word = insert[2]
-    ins_word = _create_sentence(ins_word, space=False, abbr=True)
-    enc_word = _create_sentence(enc_word, space=False, abbr=True)
+    ins_word = _create_sentence(insert[0], space=False, abbr=True)
+    enc_word = _create_sentence(insert[2], space=False, abbr=True)
+
+    return enc_word, ins_word, _create_sentence(syn)
 
-    syn_sent = _create_sentence(syn)
 
-    return _get_all_insertions(syn_sent, enc_word, ins_word, solution_format)
+def _extract_hidden_word(parse_tree):
+    """
+    Returns the hiding word and the synonym part of a hidden word tree
+    """
+    hidden, syn = _get_parts_ignore_EQU(parse_tree)
+
+    # Get the hiding word
+    hiding_word = hidden[0]
+    if not hiding_word.label() == 'HID_WORD':
+        hiding_word = hidden[1]
+
+    return _create_sentence(hiding_word, space=False), _create_sentence(syn)
 
 
-def _get_all_insertions(synonym, enc_word, ins_word, solution_format=None):
+def _solve_double_synonym(first_syn, second_syn, solution_format=None):
     """
-    Given an enclosing word and an inserted word, calculates the match score for each possible insertion of the second
-    in the first
+    Solver for double synonym clues
     """
-    words = [enc_word[0:i] + ins_word + enc_word[i:] for i in range(1, len(enc_word))]
+    # Get the top 1000 words matching both parts of the clue, with the value being the product of the values for each
+    # syn part (only among the words with the format's word lengths), with spaces instead of underscores
     if solution_format is not None:
-        words = [solution_format.add_spaces(word) for word in words if solution_format.check(word)]
+        solutions = SimilaritySolver.solve_double(first_syn, second_syn, pattern=solution_format.lengths)
+    else:
+        solutions = SimilaritySolver.solve_double(first_syn, second_syn)
+    Instrumentation.count("candidates_generated", len(solutions))
+    solutions = [(word.replace("_", " "), score) for word, score in solutions]
+    if solution_format is not None:
+        solutions = solution_format.filter(solutions, key=lambda solution: solution[0])
+    Instrumentation.count("candidates_after_format", len(solutions))
 
-    solutions = [(word, SimilaritySolver.solve(synonym, 0, word.replace(" ", "_"))) for word in words]
     return solutions
 
 
-def _solve_hidden_word(parse_tree, solution_format=None):
+def _solve_anagram(anag_word, syn_sent, solution_format=None):
     """
-    Solver for hidden word clues
+    Solver for anagram clues
     """
-    hidden, syn = _get_parts_ignore_EQU(parse_tree)
+    # Get all WordNet words made of the letters of the anagramed word and filter with solution_format (if given)
+    forms = LemmaIndex.anagrams(anag_word)
+    Instrumentation.count("candidates_generated", len(forms))
+    phrases = []
+    if solution_format is not None:
+        # (a lemma must also have the words of the format, so a single word isn't split into several)
+        forms = [form for form in solution_format.filter(forms, key=LemmaIndex.letters)
+                 if LemmaIndex.word_lengths(form) == tuple(solution_format.lengths)]
+        words = [solution_format.add_spaces(LemmaIndex.letters(form)) for form in forms]
+        if solution_format.num_of_words > 1:
+            # Add sequences of real words that fit the format, for solutions that are not WordNet lemmas (the lemmas
+            # come first). The walk for them is bounded (see MAX_WALKED_PHRASES), and only the phrases it found that
+            # are nearest in meaning to the definition are scored.
+            phrases = LemmaIndex.anagram_phrases(anag_word, solution_format.lengths, solution_format.letters,
+                                                 MAX_WALKED_PHRASES, MAX_ANAGRAM_NODES, check_cancelled)
+            phrases = [phrase for phrase in phrases if phrase not in words]
+            Instrumentation.count("candidates_generated", len(phrases))
+            phrases = SimilaritySolver.nearest_phrases(syn_sent, phrases, MAX_ANAGRAM_PHRASES)
+    else:
+        words = [form.replace("_", " ") for form in forms]
+    Instrumentation.count("candidates_after_format", len(forms) + len(phrases))
 
-    # Get the hiding word
-    hiding_word = hidden[0]
-    if not hiding_word.label() == 'HID_WORD':
-        hiding_word = hidden[1]
+    # Calculate match score for all possible solutions
+    solutions = _score_solutions(syn_sent, words, forms) + _score_phrases(syn_sent, phrases)
 
-    hiding_word = _create_sentence(hiding_word, space=False)
+    return solutions
 
-    syn_sent = _create_sentence(syn)
 
+def _solve_reverse(reverse_word, syn_sent, solution_format=None):
+    """
+    Solver for reversal clues
+    """
+    # Reverse the word and check if it fits format (if given)
+    reversed = reverse_word[::-1]
+    Instrumentation.count("candidates_generated")
+    if solution_format is not None:
+        if not solution_format.check(reversed):
+            return []
+        reversed = solution_format.add_spaces(reversed)
+    Instrumentation.count("candidates_after_format")
+
+    # Calculate match score
+    return _score_solutions(syn_sent, [reversed])
+
+
+def _get_all_insertions(enc_word, ins_word, synonym, solution_format=None):
+    """
+    Solver for enclosure and insertion clues: given an enclosing word and an inserted word, calculates the match score
+    for each possible insertion of the second in the first
+    """
+    words = [enc_word[0:i] + ins_word + enc_word[i:] for i in range(1, len(enc_word))]
+    Instrumentation.count("candidates_generated", len(words))
+    if solution_format is not None:
+        words = [solution_format.add_spaces(word) for word in solution_format.filter(words)]
+    Instrumentation.count("candidates_after_format", len(words))
+
+    solutions = _score_solutions(synonym, words)
+    return solutions
+
+
+def _solve_hidden_word(hiding_word, syn_sent, solution_format=None):
+    """
+    Solver for hidden word clues
+    """
     if solution_format is not None:
         # Get all substrings of the hiding word in the right length and check format
         total_length = solution_format.get_total_length()
         words = [hiding_word[i:i + total_length] for i in range(len(hiding_word) - total_length + 1)]
-        words = [word for word in words if solution_format.check(word)]
+        Instrumentation.count("candidates_generated", len(words))
+        words = solution_format.filter(words)
     else:
         # If format is unknown, try all lengths for substrings
         words = []
         for length in range(1, len(hiding_word)):
             words += [hiding_word[i:i + length] for i in range(len(hiding_word) - length + 1)]
+        Instrumentation.count("candidates_generated", len(words))
+    Instrumentation.count("candidates_after_format", len(words))
 
     # Get match score for all substrings
-    solutions = [(word, SimilaritySolver.solve(syn_sent, 0, word.replace(" ", "_"))) for word in words]
+    solutions = _score_solutions(syn_sent, words)
 
     return solutions
 
 
+def _score_solutions(synonym, words, forms=None):
+    """
+    Calculates the match score of each possible solution to the synonym part of the clue.
+    The clue-side work is done only once for all solutions. Each solution is scored by its WordNet form (underscores
+    instead of spaces), unless other forms are given.
+    """
+    if len(words) == 0:
+        return []
+
+    if forms is None:
+        forms = [word.replace(" ", "_") for word in words]
+
+    # Score the solutions in chunks, and stop between them if the clue was cancelled
+    with Instrumentation.stage("similarity"):
+        context = SimilaritySolver.ClueContext(synonym)
+    scores = []
+    for i in range(0, len(forms), SCORE_CHUNK_SIZE):
+        check_cancelled()
+        with Instrumentation.stage("similarity"):
+            scores += SimilaritySolver.score_candidates(context, forms[i:i + SCORE_CHUNK_SIZE])
+    return list(zip(words, scores))
+
+
+def _score_phrases(synonym, phrases):
+    """
+    Calculates the match score of each phrase (words separated by spaces) to the synonym part of the clue: the score of
+    its WordNet form (e.g. an inflected collocation), or, if its WordNet form gets no score (WordNet doesn't know most
+    phrases), the mean score of its words times UNKNOWN_PHRASE_FACTOR.
+    """
+    if len(phrases) == 0:
+        return []
+
+    with Instrumentation.stage("similarity"):
+        context = SimilaritySolver.ClueContext(synonym)
+        scores = SimilaritySolver.score_candidates(context, [phrase.replace(" ", "_") for phrase in phrases])
+
+    check_cancelled()
+    with Instrumentation.stage("similarity"):
+        words = list(dict.fromkeys(word for phrase, score in zip(phrases, scores) if not score
+                                   for word in phrase.split()))
+        word_scores = dict(zip(words, SimilaritySolver.score_candidates(context, words)))
+
+    return [(phrase, score or UNKNOWN_PHRASE_FACTOR * sum(word_scores[word] for word in phrase.split()) /
+             len(phrase.split())) for phrase, score in zip(phrases, scores)]
+
+
 def _get_parts_ignore_EQU(parse_tree):
     """
     Given a parse tree with 2 parts, with a possible EQU part in the middle, finds the synonym part and the other part
@@ -238,41 +646,47 @@ def _create_sentence(parse_tree, space=True, abbr=False):
 
 def _handle_abbreviations(parse_tree):
     """
-    Parses the abbreviation file to find all possible abbreviations, then calls helper function to update the tree
+    Finds all the abbreviated words in the tree and returns a list of trees, one for each possible choice of
+    abbreviations (a word can have several abbreviations). If there are no abbreviated words, the tree is returned as is.
     """
-    path = os.path.join(GrammarDefinitions.FOLDER, GrammarDefinitions.ABBREVIATION_FILE)
-    with open(path, "r") as f:
-        lines = f.read().splitlines()
+    positions = [position for position in parse_tree.treepositions()
+                 if not isinstance(parse_tree[position], str) and parse_tree[position].label() == 'ABBR']
+    if len(positions) == 0:
+        return [parse_tree]
 
-    abbr_dict = {line.split(GrammarDefinitions.ABBR_SEP)[0]: line.split(GrammarDefinitions.ABBR_SEP)[1] for line in
-                 lines}
-    _replace_abbreviation(parse_tree, abbr_dict)
+    abbreviations = Lexicon.get_abbreviations()
+    choices = [abbreviations[" ".join(parse_tree[position].leaves())] for position in positions]
 
+    trees = []
+    for choice in itertools.product(*choices):
+        tree = parse_tree.copy(deep=True)
+        for position, abbreviation in zip(positions, choice):
+            _replace_abbreviation(tree[position], abbreviation)
+        trees.append(tree)
 
-def _replace_abbreviation(parse_tree, abbr_dict):
+    return trees
+
+
+def _replace_abbreviation(parse_tree, abbreviation):
     """
-    Updates the given tree by replacing the word with its abbreviated form
+    Updates the given ABBR tree by replacing the word (or the words of a phrase) with its abbreviated form
     """
-    if not isinstance(parse_tree, nltk.Tree):
-        # Reached a leaf
-        return
-
-    if parse_tree.label() == 'ABBR':
-        # Replace word with its abbreviation
-        word = parse_tree[0]
-        parse_tree.set_label('WORD')
-        parse_tree[0] = abbr_dict[word]
-        return
+    parse_tree.set_label('WORD')
+    parse_tree[:] = [abbreviation]
 
-    for son in parse_tree:
-        # Recursive call
-        _replace_abbreviation(son, abbr_dict)
 
+EXTRACTOR_DICT = {"DOUBLE_SYN": _extract_double_synonym,
+                  "ANAG": _extract_anagram,
+                  "REVERSE": _extract_reverse,
+                  "ENCLOSE": _extract_enclosure,
+                  "INSERT": _extract_insertion,
+                  "HIDDEN": _extract_hidden_word
+                  }
 
 SOLVER_DICT = {"DOUBLE_SYN": _solve_double_synonym,
                "ANAG": _solve_anagram,
                "REVERSE": _solve_reverse,
-               "ENCLOSE": _solve_enclosure,
-               "INSERT": _solve_insertion,
+               "ENCLOSE": _get_all_insertions,
+               "INSERT": _get_all_insertions,
                "HIDDEN": _solve_hidden_word
                }
@@ -1,9 +1,16 @@
+import os
 import string
 from SolutionFormat import SolutionFormat
-from ClueSolver import solve
+from ClueSolver import solve_with_budget, get_executor
+import ResultCache
+
+# Seconds to search before showing the solutions found so far
+TIME_BUDGET = 10
 
 
 def CrypticSolver():
+    # Solve the parse trees of each clue in parallel if there are several CPUs (the workers start loading right away)
+    executor = get_executor() if os.cpu_count() > 1 else None
     print_header()
     run = True
 
@@ -35,7 +42,14 @@ def CrypticSolver():
             else:
                 solution_format = None
 
-        solutions = solve(clue, solution_format)
+        # Use the solutions of the clue if it was solved before (here or e.g. by SolveFromFile). Only complete solutions
+        # are cached, so a clue that was cut by the budget is solved again next time.
+        cache = ResultCache.get_cache()
+        solutions = cache.get(clue, solution_format)
+        if solutions is None:
+            solutions, complete = solve_with_budget(clue, solution_format, time_budget=TIME_BUDGET, executor=executor)
+            if complete:
+                cache.put(clue, solution_format, solutions)
         print_solutions(solutions)
 
         run = print_end()
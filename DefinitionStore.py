@@ -0,0 +1,104 @@
+"""
+This file holds a persistent store of the words in the definitions of all WordNet synsets, as used by the Lesk score.
+Each definition is tokenized and filtered once, and saved as an array of distinct word ids per synset (in CSR form:
+row pointers and word ids). The arrays are memory-mapped when loaded, so the tokenizer is never used while scoring.
+"""
+
+
+import os
+import os.path
+import pickle
+import shutil
+import numpy as np
+from nltk.corpus import wordnet as wn
+from nltk.tokenize import word_tokenize
+import LemmaIndex
+import WordNetSnapshot
+
+STORE_FOLDER = "definitions_%s"
+NAMES_FILE = "names.pickle"
+ARRAY_FILES = ["indptr.npy", "words.npy", "counts.npy"]
+
+_store = None
+
+
+class DefinitionStore:
+    """
+    Object that gives access to the stored definition words.
+    Synsets are numbered by their position in synset_names and words by their position in vocabulary.
+    """
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, NAMES_FILE), "rb") as f:
+            self.synset_names, self.vocabulary = pickle.load(f)
+        self.synset_ids = {name: i for i, name in enumerate(self.synset_names)}
+        self.word_ids = {word: i for i, word in enumerate(self.vocabulary)}
+
+        # synset -> distinct filtered definition words, and the number of filtered words before removing duplicates
+        self.indptr, self.words, self.counts = [np.load(os.path.join(folder, name), mmap_mode="r")
+                                                for name in ARRAY_FILES]
+
+    def definition_words(self, synset):
+        """
+        Returns a list of the ids of the distinct words in the synset's definition
+        """
+        i = self.synset_ids[synset.name()]
+        return self.words[self.indptr[i]:self.indptr[i + 1]].tolist()
+
+    def word_count(self, synset):
+        """
+        Returns the number of words in the synset's definition, including repeated words
+        """
+        return int(self.counts[self.synset_ids[synset.name()]])
+
+    def get_word_ids(self, words):
+        """
+        Returns the set of ids of the given words. Words that don't appear in any definition are ignored.
+        """
+        return {self.word_ids[word] for word in words if word in self.word_ids}
+
+
+def get_store():
+    """
+    Returns the definition store, building it in the index folder first if it doesn't exist yet
+    """
+    global _store
+    if _store is None:
+        folder = os.path.join(LemmaIndex.INDEX_FOLDER, STORE_FOLDER % WordNetSnapshot.get_version())
+        if not os.path.exists(folder):
+            build_store(folder)
+        _store = DefinitionStore(folder)
+
+    return _store
+
+
+def build_store(folder):
+    """
+    Tokenizes the definitions of all synsets in WordNet and saves the store to the given folder
+    """
+    from SimilaritySolver import _remove_non_alphabet
+
+    synset_names = []
+    vocabulary = {}
+    definitions = []
+    counts = []
+    for synset in wn.all_synsets():
+        def_words = word_tokenize(synset.definition())
+        synset_names.append(synset.name())
+        counts.append(len(_remove_non_alphabet(def_words)))
+        def_words = _remove_non_alphabet(list(set(def_words)))
+        definitions.append([vocabulary.setdefault(word, len(vocabulary)) for word in def_words])
+
+    indptr = np.zeros(len(definitions) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(def_words) for def_words in definitions])
+    words = np.array([word for def_words in definitions for word in def_words], dtype=np.int32)
+
+    # Write to a temporary folder of this process and move it at once, so no one reads a partially written store
+    temp_folder = "%s.tmp%s" % (folder, os.getpid())
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    with open(os.path.join(temp_folder, NAMES_FILE), "wb") as f:
+        pickle.dump((synset_names, list(vocabulary)), f, protocol=pickle.HIGHEST_PROTOCOL)
+    for name, array in zip(ARRAY_FILES, [indptr, words, np.array(counts, dtype=np.int32)]):
+        np.save(os.path.join(temp_folder, name), array)
+    LemmaIndex.replace_folder(temp_folder, folder)
@@ -1,12 +1,18 @@
 """
 This file is used to define the entire Context-Free Grammar for solving cryptic clues. It combines rules for each type
 of clue, general rules, rules for identifying possible abbreviations and possible indicator words.
-Abbreviation and indicator words are pulled from text files.
+Abbreviation and indicator words are pulled from text files (through the Lexicon).
 The WORD rule is defined by the specific words in the clue (rather than having a general rule for all words).
+All the other rules are compiled only once. Each clue is parsed with a grammar of its own (see get_clue_grammar),
+which has only the rules that can take part in a parse of that clue: the indicators and abbreviations found in the clue
+are matched first, and the rules of clue types whose indicators aren't in the clue are left out.
+The solver finds the subproblems of clues with ClueParser, which follows the shape of this grammar without building a
+chart. The grammar is still the definition the parser is checked against (see ClueParser).
 """
 
 
-import os.path
+import Lexicon
+import nltk
 
 IDENTIFIER_TYPES = ["ANAG_IDT", "REV_IDT", "ENC_IDT", "INS_IDT", "HID_IDT", "EQU"]
 CLUE_TYPES = {
@@ -46,49 +52,122 @@ CLUE_TYPES = {
 GENERAL_RULES = ["SYN -> WORD SYN | WORD",
                  "WORDABBR -> WORD | ABBR"]
 
-ABBREVIATION_FILE = "ABBR.txt"
-ABBR_SEP = "---"
-FOLDER = "Word lists"
+WORD = nltk.Nonterminal("WORD")
+
+_static_grammar = None
+_static_grammar_version = None
+_rules = None       # productions of the static grammar that only have nonterminals on their right hand side
+
+
+def get_parser(clue):
+    """
+    Returns a chart parser for the given clue, using the clue's own grammar
+    """
+    return nltk.ChartParser(get_clue_grammar(clue))
+
+
+def get_clue_grammar(clue):
+    """
+    Returns the grammar of a single clue: the WORD productions of its words, a production for each indicator and
+    abbreviation found in it (also ones of several words, e.g. ANAG_IDT -> 'all' 'over' 'the' 'place') and the rules of
+    the static grammar that can still take part in a parse tree of the clue (see _prune).
+    """
+    static_grammar = get_static_grammar()
+    productions = [nltk.Production(WORD, [word]) for word in dict.fromkeys(clue)]
+    matcher = Lexicon.get_matcher(IDENTIFIER_TYPES + [Lexicon.ABBREVIATIONS])
+    productions += dict.fromkeys(nltk.Production(nltk.Nonterminal(name), clue[start:end])
+                                 for start, end, name in matcher.find(clue))
+
+    return nltk.CFG(static_grammar.start(), _prune(_rules + productions, static_grammar.start()))
+
+
+def _prune(productions, start):
+    """
+    Returns only the productions that can be part of a parse tree: the ones whose right hand side can produce words, and
+    whose left hand side can be reached from the start symbol
+    """
+    productive = set()
+    changed = True
+    while changed:
+        changed = False
+        for production in productions:
+            if production.lhs() not in productive and all(not isinstance(symbol, nltk.Nonterminal) or
+                                                          symbol in productive for symbol in production.rhs()):
+                productive.add(production.lhs())
+                changed = True
+    productions = [production for production in productions
+                   if all(not isinstance(symbol, nltk.Nonterminal) or symbol in productive
+                          for symbol in production.rhs())]
+
+    reachable = {start}
+    stack = [start]
+    while stack:
+        lhs = stack.pop()
+        for production in productions:
+            if production.lhs() == lhs:
+                for symbol in production.rhs():
+                    if isinstance(symbol, nltk.Nonterminal) and symbol not in reachable:
+                        reachable.add(symbol)
+                        stack.append(symbol)
+
+    return [production for production in productions if production.lhs() in reachable]
+
+
+def get_static_grammar():
+    """
+    Returns the compiled grammar of all rules except WORD (compiled only once, and again if the Lexicon is reloaded)
+    """
+    global _static_grammar, _static_grammar_version, _rules
+    if _static_grammar is None or _static_grammar_version != Lexicon.version:
+        _static_grammar = nltk.CFG.fromstring(define_static_grammar())
+        _static_grammar_version = Lexicon.version
+        _rules = [production for production in _static_grammar.productions() if production.is_nonlexical()]
+
+    return _static_grammar
+
 
 def define_grammar(clue):
+    word_rule = "WORD ->" + " | ".join(["'%s'" % word for word in clue])    # WORD -> all words in the clue
+    grammar = define_static_grammar() + "\n" + word_rule
+    return grammar
+
+
+def define_static_grammar():
     initial_rule = "S -> " + " | ".join(CLUE_TYPES.keys())                  # S -> all clue types
     clue_types_rules = "\n".join(CLUE_TYPES.values())
     general_rules = "\n".join(GENERAL_RULES)
-    word_rule = "WORD ->" + " | ".join(["'%s'" % word for word in clue])    # WORD -> all words in the clue
     identifiers_rule = create_identifiers_rules()
     abbreviation_rule = create_abbreviation_rule()
     grammar = initial_rule + "\n" + clue_types_rules + "\n" + general_rules + "\n" + identifiers_rule + \
-              "\n" + abbreviation_rule + "\n" + word_rule
+              "\n" + abbreviation_rule
     return grammar
 
 
 def create_identifiers_rules():
     rules = ""
     for type in IDENTIFIER_TYPES:
-        rule = create_rule_from_file(type, type + ".txt")
+        rule = create_rule(type, Lexicon.get_word_list(type))
         rules += (rule + "\n")
 
     return rules
 
 
-def create_rule_from_file(rule_name, file_name):
-    path = os.path.join(FOLDER, file_name)
-
-    with open(path, "r") as f:
-        words = f.read().splitlines()
-
-    words = [word.lower() for word in words]
-    rule = rule_name + " -> " + " | ".join(["'%s'" % word for word in words])  # IDENTIFIER TYPE -> all identifier words
+def create_rule(rule_name, words):
+    # IDENTIFIER TYPE -> all identifier words
+    rule = rule_name + " -> " + " | ".join([_terminals(word) for word in words])
 
     return rule
 
 
 def create_abbreviation_rule():
-    path = os.path.join(FOLDER, ABBREVIATION_FILE)
-    with open(path, "r") as f:
-        lines = f.read().splitlines()
-
-    words = [line.split(ABBR_SEP)[0].lower() for line in lines]
-    rule = "ABBR -> " + " | ".join(["'%s'" % word for word in words])   # ABBR -> all words that can be abbreviated
+    words = Lexicon.get_abbreviations().keys()
+    rule = "ABBR -> " + " | ".join([_terminals(word) for word in words])    # ABBR -> all words that can be abbreviated
 
     return rule
+
+
+def _terminals(phrase):
+    """
+    Returns the terminals of a word or a phrase of several words (e.g. 'at' 'sea'), as clues are parsed word by word
+    """
+    return " ".join(["'%s'" % word for word in phrase.split()])
@@ -0,0 +1,190 @@
+"""
+This file holds opt-in instrumentation of the solver: timings and candidate counts per clue, per clue type and per
+stage (parsing, solving each type of parse tree, similarity scoring...).
+While disabled (the default), all functions return immediately, so the solver isn't slowed down.
+Each solved clue gets a record (a dictionary), which can be written as JSON lines or aggregated into a summary table.
+"""
+
+
+import collections
+import contextlib
+import json
+import time
+
+enabled = False
+
+_current = None         # record of the clue being solved
+_active_stages = []     # names of the stages currently timed (stages can be nested)
+_active_types = []      # clue types currently timed
+_records = []           # records of solved clues that were not taken yet
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def start_clue(clue):
+    """
+    Starts a new record for the given clue (a list of words)
+    """
+    global _current
+    if not enabled:
+        return
+
+    _current = {"clue": " ".join(clue),
+                "time": time.perf_counter(),
+                "stages": collections.defaultdict(float),
+                "counts": collections.defaultdict(int),
+                "types": {}}
+
+
+def end_clue():
+    """
+    Finishes the record of the current clue and keeps it until it is taken (see take_records)
+    """
+    global _current
+    if not enabled or _current is None:
+        return
+
+    _current["time"] = time.perf_counter() - _current["time"]
+    _current["stages"] = dict(_current["stages"])
+    _current["counts"] = dict(_current["counts"])
+    _records.append(_current)
+    _current = None
+
+
+@contextlib.contextmanager
+def stage(name, clue_type=None):
+    """
+    Context manager that adds the time spent in its block to the given stage of the current clue.
+    If a clue type is given, the time (and the counts made in the block) are also added to that clue type.
+    A stage nested in itself (e.g. through recursion) is timed only once.
+    """
+    if not enabled or _current is None or name in _active_stages:
+        yield
+        return
+
+    _active_stages.append(name)
+    if clue_type is not None:
+        _active_types.append(clue_type)
+        type_record = _current["types"].setdefault(clue_type, {"trees": 0, "time": 0.0, "counts": {}})
+        type_record["trees"] += 1
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current["stages"][name] += elapsed
+        _active_stages.pop()
+        if clue_type is not None:
+            _current["types"][clue_type]["time"] += elapsed
+            _active_types.pop()
+
+
+def count(name, amount=1):
+    """
+    Adds the amount to the given counter of the current clue (and of the clue type being solved, if any)
+    """
+    if not enabled or _current is None:
+        return
+
+    _current["counts"][name] += amount
+    if _active_types:
+        counts = _current["types"][_active_types[-1]]["counts"]
+        counts[name] = counts.get(name, 0) + amount
+
+
+def take_records():
+    """
+    Returns the records of all the clues solved since the last call, and forgets them
+    """
+    records = list(_records)
+    _records.clear()
+    return records
+
+
+def add_records(records):
+    """
+    Adds records made elsewhere (e.g. in a worker process), so they are returned by the next take_records
+    """
+    _records.extend(records)
+
+
+def write_json_lines(records, f):
+    """
+    Writes each record as a line of JSON to the given open file
+    """
+    for record in records:
+        f.write(json.dumps(record) + "\n")
+
+
+class Summary:
+    """
+    Object that aggregates records into totals per stage, per clue type and per counter, and formats them as a table.
+    Only the totals are kept, so any number of records can be added.
+    """
+
+    def __init__(self):
+        self.num_of_clues = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slowest_clue = None
+        self.stages = collections.defaultdict(lambda: [0, 0.0, 0.0])        # name -> [clues, total, max]
+        self.types = collections.defaultdict(lambda: [0, 0, 0.0, 0.0])      # type -> [clues, trees, total, max]
+        self.counts = collections.defaultdict(lambda: [0, 0, 0])            # name -> [clues, total, max]
+
+    def add(self, record):
+        self.num_of_clues += 1
+        self.total_time += record["time"]
+        if record["time"] >= self.max_time:
+            self.max_time = record["time"]
+            self.slowest_clue = record["clue"]
+
+        for name, elapsed in record["stages"].items():
+            _add_to_totals(self.stages[name], elapsed)
+        for clue_type, type_record in record["types"].items():
+            totals = self.types[clue_type]
+            totals[1] += type_record["trees"]
+            _add_to_totals(totals, type_record["time"], total_index=2)
+        for name, amount in record["counts"].items():
+            _add_to_totals(self.counts[name], amount)
+
+    def __str__(self):
+        lines = ["Clues: %s, total time: %.3f seconds, mean: %.3f seconds, slowest: %.3f seconds (%s)"
+                 % (self.num_of_clues, self.total_time, self.total_time / max(self.num_of_clues, 1), self.max_time,
+                    self.slowest_clue),
+                 "",
+                 "%-30s %8s %12s %12s %12s" % ("Stage", "Clues", "Total (s)", "Mean (s)", "Max (s)")]
+        for name in sorted(self.stages):
+            clues, total, maximum = self.stages[name]
+            lines.append("%-30s %8s %12.3f %12.3f %12.3f" % (name, clues, total, total / clues, maximum))
+
+        lines += ["", "%-30s %8s %8s %12s %12s %12s" % ("Clue type", "Clues", "Trees", "Total (s)", "Mean (s)",
+                                                        "Max (s)")]
+        for clue_type in sorted(self.types):
+            clues, trees, total, maximum = self.types[clue_type]
+            lines.append("%-30s %8s %8s %12.3f %12.3f %12.3f" % (clue_type, clues, trees, total, total / clues,
+                                                                 maximum))
+
+        lines += ["", "%-30s %8s %12s %12s %12s" % ("Counter", "Clues", "Total", "Mean", "Max")]
+        for name in sorted(self.counts):
+            clues, total, maximum = self.counts[name]
+            lines.append("%-30s %8s %12s %12.1f %12s" % (name, clues, total, total / clues, maximum))
+
+        return "\n".join(lines)
+
+
+def _add_to_totals(totals, value, total_index=1):
+    """
+    Updates a list of [number of clues, ..., total, max] with the value of one more clue
+    """
+    totals[0] += 1
+    totals[total_index] += value
+    totals[total_index + 1] = max(totals[total_index + 1], value)
@@ -0,0 +1,326 @@
+"""
+This file holds precomputed indexes over the WordNet vocabulary. The indexes are built once from WordNet, saved to the
+index folder and loaded lazily on first use, so the solvers can look up candidate words instead of generating them.
+"""
+
+
+import collections
+import os.path
+import pickle
+import shutil
+import re
+import numpy as np
+from nltk.corpus import wordnet as wn
+import WordNetSnapshot
+
+INDEX_FOLDER = "Indexes"
+ANAGRAM_INDEX_FILE = "anagrams_%s.pickle"
+TRIE_FILE = "word_trie_%s.pickle"
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+END_BIT = 1 << len(ALPHABET)    # bit of the trie node mask that marks the end of a word
+CHECK_NODES = 10000             # number of trie nodes visited between calls to the check function of a walk
+
+_anagram_index = None
+_trie = None
+
+
+class LetterTrie:
+    """
+    Object that holds a trie of all real single WordNet words made only of letters (see _real_word_forms).
+    The trie is kept compactly in two arrays: each node has a mask with a bit for each letter that has a child (and
+    END_BIT if a word ends at the node), and the index of its first child. The children of a node are numbered
+    consecutively in alphabetical order, so the child of a letter is found by counting the lower bits in the mask.
+    """
+
+    def __init__(self, data):
+        self.masks, self.first_children = data
+
+    def anagram_phrases(self, word, lengths, known_letters=None, limit=None, max_nodes=None, check=None):
+        """
+        Returns sequences of words in the trie that are made of exactly the letters of the given word and fit the
+        given format. Only real prefixes of words are walked, and the known letters are fixed at their positions, so
+        the permutations of the letters are never generated.
+        :param word: the letters to rearrange.
+        :param lengths: the length of each word of the solution. Each word of the sequence is a single word of the
+        trie (multi-word WordNet lemmas are not in the trie, they are found by the anagram index).
+        :param known_letters: a dictionary from (word number, letter number) to the known letter at this position (as
+        in SolutionFormat.letters).
+        :param limit: the maximal number of sequences to return (None for all of them).
+        :param max_nodes: the maximal number of trie nodes to visit (None for no limit). Long words with several
+        words in the format can have millions of sequences, so the walk stops at this number of nodes.
+        :param check: a function that is called every CHECK_NODES visited nodes, e.g. to stop the walk by raising an
+        exception.
+        :return: A list of the found sequences, with spaces between the words.
+        """
+        word = letters(word)
+        if len(word) != sum(lengths) or not all(char in ALPHABET for char in word):
+            return []
+
+        counts = [0] * len(ALPHABET)
+        for char in word:
+            counts[ALPHABET.index(char)] += 1
+
+        # Position of each known letter (as a mask of its bit) in the sequence without spaces, and the positions where
+        # words end
+        known = {}
+        for (i, j), letter in (known_letters or {}).items():
+            known[sum(lengths[:i]) + j] = 1 << ALPHABET.index(letter.lower())
+        ends = {sum(lengths[:i + 1]) for i in range(len(lengths) - 1)}
+
+        walk = _Walk(counts, known, ends, limit, max_nodes, check)
+        self._walk(0, 0, [], walk)
+        return walk.found
+
+    def _walk(self, node, position, prefix, walk):
+        """
+        Recursively walks the trie from the given node, using each of the remaining letters (in walk.counts) once, and
+        adds the solutions to walk.found. The position is the number of letters used so far.
+        """
+        walk.visit()
+        mask = int(self.masks[node])
+        if position in walk.ends and prefix[-1] != " ":
+            # The current word must end here, and the next one starts at the root
+            if mask & END_BIT:
+                prefix.append(" ")
+                self._walk(0, position, prefix, walk)
+                prefix.pop()
+            return
+
+        counts = walk.counts
+        if not any(counts):
+            if mask & END_BIT:
+                walk.found.append("".join(prefix))
+            return
+
+        # Letters that have a child (only the known letter, if there is one)
+        options = mask & walk.known.get(position, END_BIT - 1)
+        first_child = int(self.first_children[node])
+        while options and not walk.is_done():
+            bit = options & -options
+            options ^= bit
+            letter = bit.bit_length() - 1
+            if counts[letter]:
+                counts[letter] -= 1
+                prefix.append(ALPHABET[letter])
+                self._walk(first_child + bin(mask & (bit - 1)).count("1"), position + 1, prefix, walk)
+                prefix.pop()
+                counts[letter] += 1
+
+
+class _Walk:
+    """
+    Object that holds the state of a walk of the trie (see LetterTrie.anagram_phrases): the remaining letters, the
+    known letters and the word ends, the found sequences, and the limits of the walk
+    """
+
+    def __init__(self, counts, known, ends, limit, max_nodes, check):
+        self.counts = counts
+        self.known = known
+        self.ends = ends
+        self.found = []
+        self.limit = limit if limit is not None else float("inf")
+        self.nodes_left = max_nodes if max_nodes is not None else float("inf")
+        self.check = check
+        self._until_check = CHECK_NODES
+
+    def visit(self):
+        self.nodes_left -= 1
+        self._until_check -= 1
+        if self._until_check == 0:
+            self._until_check = CHECK_NODES
+            if self.check is not None:
+                self.check()
+
+    def is_done(self):
+        return len(self.found) >= self.limit or self.nodes_left <= 0
+
+
+def letters(word):
+    """
+    Returns the letters of the given word, in lower case and without spaces, underscores or punctuation
+    """
+    return "".join([char for char in word.lower() if char.isalpha()])
+
+
+def anagram_key(word):
+    """
+    Returns the key of the given word in the anagram index (its letters in sorted order)
+    """
+    return "".join(sorted(letters(word)))
+
+
+def anagrams(word):
+    """
+    Returns all WordNet words (lemmas and their inflected forms) made of exactly the same letters as the given word
+    """
+    return get_anagram_index().get(anagram_key(word), ())
+
+
+def anagram_phrases(word, lengths, known_letters=None, limit=None, max_nodes=None, check=None):
+    """
+    Returns sequences of WordNet words (separated by spaces) made of exactly the same letters as the given word, where
+    each word has the given length and the known letters are at their positions (see LetterTrie.anagram_phrases)
+    """
+    return get_trie().anagram_phrases(word, lengths, known_letters, limit, max_nodes, check)
+
+
+def word_lengths(lemma):
+    """
+    Returns a tuple of the lengths of the words of the given lemma name (e.g. (3, 5) for "ice_cream"), like
+    SolutionFormat.lengths
+    """
+    return tuple(len(word) for word in lemma.split("_"))
+
+
+def build_length_index(lemma_names):
+    """
+    Creates two dictionaries of lemma ids (positions in the given list of lemma names), sorted, as NumPy arrays: one by
+    the total length of the lemma name (with underscores) and one by its word lengths (see word_lengths)
+    """
+    lengths = {}
+    patterns = {}
+    for i, lemma in enumerate(lemma_names):
+        lengths.setdefault(len(lemma), []).append(i)
+        patterns.setdefault(word_lengths(lemma), []).append(i)
+
+    return ({length: np.array(ids, dtype=np.int64) for length, ids in lengths.items()},
+            {pattern: np.array(ids, dtype=np.int64) for pattern, ids in patterns.items()})
+
+
+def get_anagram_index():
+    """
+    Returns the anagram index, loading it from the index folder (or building it if it doesn't exist yet)
+    """
+    global _anagram_index
+    if _anagram_index is None:
+        path = os.path.join(INDEX_FOLDER, ANAGRAM_INDEX_FILE % WordNetSnapshot.get_version())
+        _anagram_index = load_or_build(path, build_anagram_index)
+
+    return _anagram_index
+
+
+def get_trie():
+    """
+    Returns the letter trie, loading it from the index folder (or building it if it doesn't exist yet)
+    """
+    global _trie
+    if _trie is None:
+        path = os.path.join(INDEX_FOLDER, TRIE_FILE % WordNetSnapshot.get_version())
+        _trie = LetterTrie(load_or_build(path, build_trie))
+
+    return _trie
+
+
+def build_anagram_index():
+    """
+    Creates a dictionary from sorted letters to all the words that are made of these letters.
+    The words include all lemma names in WordNet, as well as the inflected forms that WordNet maps back to them (e.g.
+    plurals), so the index covers every word that could get a score from SimilaritySolver.
+    """
+    index = {}
+    for word in _all_word_forms():
+        key = anagram_key(word)
+        if key:
+            index.setdefault(key, []).append(word)
+
+    return {key: tuple(words) for key, words in index.items()}
+
+
+def build_trie():
+    """
+    Creates the arrays of the letter trie of all real single WordNet words (see LetterTrie)
+    """
+    root = {}
+    for word in {form.lower() for form in _real_word_forms()}:
+        if all(char in ALPHABET for char in word):
+            node = root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[""] = None     # end of a word
+
+    # Number the nodes in breadth-first order, so the children of each node are numbered consecutively
+    masks = []
+    first_children = []
+    queue = collections.deque([root])
+    num_of_nodes = 1
+    while queue:
+        node = queue.popleft()
+        mask = END_BIT if "" in node else 0
+        first_children.append(num_of_nodes)
+        for char in sorted(char for char in node if char):
+            mask |= 1 << ALPHABET.index(char)
+            queue.append(node[char])
+            num_of_nodes += 1
+        masks.append(mask)
+
+    return np.array(masks, dtype=np.int32), np.array(first_children, dtype=np.int32)
+
+
+def _all_word_forms():
+    """
+    Returns the set of all lemma names in WordNet and their inflected forms
+    """
+    forms = set()
+    for pos in [wn.NOUN, wn.VERB, wn.ADJ, wn.ADV]:
+        substitutions = wn.MORPHOLOGICAL_SUBSTITUTIONS[pos]
+        for lemma in wn.all_lemma_names(pos=pos):
+            forms.add(lemma)
+
+            # Reverse the suffix rules used by WordNet to find base forms
+            for suffix, ending in substitutions:
+                if lemma.endswith(ending):
+                    forms.add(lemma[:len(lemma) - len(ending)] + suffix)
+
+        # Irregular forms (e.g. geese -> goose)
+        forms.update(wn._exception_map[pos].keys())
+
+    return forms
+
+
+def _real_word_forms():
+    """
+    Returns the set of the WordNet words that are known to be real words: all lemma names, the irregular forms, and the
+    inflected forms made by the suffix rules that are used in the definitions or examples of WordNet's synsets (the
+    suffix rules alone also make forms that aren't words, e.g. "goed" or "hopeing")
+    """
+    used = set()
+    for synset in wn.all_synsets():
+        for text in [synset.definition()] + synset.examples():
+            used.update(re.findall("[a-z]+", text.lower()))
+
+    known = set(wn.all_lemma_names())
+    for pos in [wn.NOUN, wn.VERB, wn.ADJ, wn.ADV]:
+        known.update(wn._exception_map[pos].keys())
+
+    return {form for form in _all_word_forms() if form in known or form in used}
+
+
+def load_or_build(path, build):
+    """
+    Loads a pickled index from the given path. If the file doesn't exist, the index is built and saved to it.
+    """
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    index = build()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = "%s.tmp%s" % (path, os.getpid())     # one per process, since several processes may build it
+    with open(temp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)     # Replace at once, so no one reads a partially written index
+
+    return index
+
+
+def replace_folder(temp_folder, folder):
+    """
+    Moves a folder written to a temporary path to its final path at once. If another process already built the same
+    folder (which can't be replaced while it isn't empty), the temporary folder is removed and the built one is kept.
+    """
+    try:
+        os.replace(temp_folder, folder)
+    except OSError:
+        if not os.path.isdir(folder):
+            raise
+        shutil.rmtree(temp_folder, ignore_errors=True)
@@ -0,0 +1,301 @@
+"""
+This file holds dense vectors of all WordNet lemmas and an approximate nearest neighbour index over them, used to pick
+the few thousand lemmas that are worth scoring as solutions to a clue before the SimilarityEngine scores them exactly.
+The vectors are made from WordNet itself by latent semantic analysis: each synset is a document of the words of its
+definition and of its hypernyms (closer hypernyms weigh more), weighted by inverse document frequency, and a truncated
+SVD of this matrix gives a vector for each synset. A lemma's vector is the sum of the vectors of its synsets, and a clue
+gets a vector in the same way, from the synsets of its words. All vectors are normalized, so the dot product of two
+vectors is their cosine similarity.
+The index is an inverted file: the lemma vectors are clustered by (spherical) k-means, and a search scores only the
+lemmas in the clusters whose centroids are closest to the clue's vector.
+The arrays are built once (run this script to build them in advance) and memory-mapped when loaded, so worker
+processes share them.
+"""
+
+
+import os
+import os.path
+import shutil
+import numpy as np
+import LemmaIndex
+import SimilarityEngine
+import WordNetSnapshot
+
+VECTORS_FOLDER = "lemma_vectors_%s"
+ARRAY_FILES = ["synset_vectors.npy", "lemma_vectors.npy", "lemma_order.npy", "cluster_indptr.npy", "centroids.npy"]
+DIMENSIONS = 128
+CLUSTERS = 512
+PROBED_CLUSTERS = 64
+
+# Randomized SVD and k-means parameters
+OVERSAMPLING = 32
+POWER_ITERATIONS = 3
+KMEANS_ITERATIONS = 15
+CHUNK_ROWS = 4096
+CHUNK_ENTRIES = 1 << 17
+
+_vectors = None
+
+
+class LemmaVectors:
+    """
+    Object that finds the lemmas nearest to a clue.
+    Lemmas are numbered as in the SimilarityEngine, and synsets as in the DefinitionStore. The lemma vectors are kept
+    in the order of their clusters (lemma_order holds the id of the lemma in each row, and the rows of each cluster are
+    given by cluster_indptr).
+    """
+
+    def __init__(self, folder):
+        self.synset_vectors, self.lemma_vectors, self.lemma_order, self.cluster_indptr, self.centroids = \
+            [np.load(os.path.join(folder, name), mmap_mode="r") for name in ARRAY_FILES]
+        self.lemma_rows = np.empty(len(self.lemma_order), dtype=np.int64)
+        self.lemma_rows[self.lemma_order] = np.arange(len(self.lemma_order))
+        self.synset_ids = SimilarityEngine.get_engine().synset_ids
+
+    def nearest_lemmas(self, clues, count, lemma_ids=None):
+        """
+        Returns a sorted array of the ids of the lemmas nearest to any of the clues: the count nearest lemmas to each.
+        :param clues: A list of clues, each given by the list of the synsets of its words (see ClueContext).
+        :param count: The number of lemmas to find for each clue.
+        :param lemma_ids: If given, only these lemmas are searched (e.g. the lemmas of the solution's length). The
+        search is then exact, since the lemmas of a single length are few enough to score them all.
+        """
+        nearest = [np.zeros(0, dtype=np.int64)]
+        for synsets in clues:
+            vector = self.clue_vector(synsets)
+            if vector is not None:
+                nearest.append(self._search(vector, count, lemma_ids))
+
+        return np.unique(np.concatenate(nearest))
+
+    def clue_vector(self, synsets):
+        """
+        Returns the normalized sum of the vectors of the given synsets (None if they have no direction)
+        """
+        vector = self._sum(synsets)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def nearest_phrases(self, synsets, phrases, count):
+        """
+        Returns the count phrases (sequences of words separated by spaces) nearest to the clue given by the synsets of
+        its words, from the nearest. A phrase gets a vector like a clue does, from the synsets of all its words.
+        """
+        clue = self.clue_vector(synsets)
+        if clue is None or len(phrases) <= count:
+            return phrases[:count]
+
+        # The summed synset vectors of each distinct word, and the words of each phrase by their row
+        words = {}
+        phrase_words = [[words.setdefault(word, len(words)) for word in phrase.split()] for phrase in phrases]
+        word_vectors = np.array([self._sum(WordNetSnapshot.synsets(word)) for word in words])
+        phrase_vectors = np.zeros((len(phrases), len(clue)), dtype=np.float32)
+        for i, row in enumerate(phrase_words):
+            phrase_vectors[i] = word_vectors[row].sum(axis=0)
+
+        scores = _normalize(phrase_vectors) @ clue
+        return [phrases[i] for i in np.argsort(-scores, kind="stable")[:count]]
+
+    def _sum(self, synsets):
+        """
+        Returns the sum of the vectors of the given synsets
+        """
+        vector = np.zeros(self.synset_vectors.shape[1], dtype=np.float32)
+        for synset in synsets:
+            vector += self.synset_vectors[self.synset_ids[synset.name()]]
+        return vector
+
+    def _search(self, vector, count, lemma_ids):
+        """
+        Returns the ids of the count lemmas (of the given ones, if any) whose vectors are closest to the given vector
+        """
+        if lemma_ids is not None:
+            candidates = np.asarray(lemma_ids, dtype=np.int64)
+            rows = self.lemma_rows[candidates]
+        else:
+            clusters = np.argsort(-(self.centroids @ vector))[:PROBED_CLUSTERS]
+            rows = np.concatenate([np.arange(self.cluster_indptr[i], self.cluster_indptr[i + 1]) for i in clusters])
+            candidates = self.lemma_order[rows]
+
+        scores = self.lemma_vectors[rows] @ vector
+        if len(scores) > count:
+            candidates = candidates[np.argpartition(-scores, count - 1)[:count]]
+
+        return candidates
+
+
+def get_vectors():
+    """
+    Returns the lemma vectors, building them in the index folder first if they don't exist yet
+    """
+    global _vectors
+    if _vectors is None:
+        folder = os.path.join(LemmaIndex.INDEX_FOLDER, VECTORS_FOLDER % WordNetSnapshot.get_version())
+        if not os.path.exists(folder):
+            build_vectors(folder)
+        _vectors = LemmaVectors(folder)
+
+    return _vectors
+
+
+def build_vectors(folder):
+    """
+    Computes the synset and lemma vectors and their index from the SimilarityEngine's arrays and the DefinitionStore,
+    and saves them to the given folder
+    """
+    engine = SimilarityEngine.get_engine()
+    vocabulary = engine.vocabulary
+    synset_count = len(engine.synset_ids)
+
+    # The features of each synset: its definition words, and itself and its hypernyms (without WordNet's fake root)
+    definitions = (np.asarray(engine.store.indptr), np.asarray(engine.store.words),
+                   np.ones(len(engine.store.words), dtype=np.float32))
+    hypernym_rows = np.repeat(np.arange(synset_count), np.diff(vocabulary.hypernym_indptr))
+    real = vocabulary.hypernym_indices < synset_count
+    hypernyms = _rows_to_csr(hypernym_rows[real], vocabulary.hypernym_indices[real] + len(engine.store.vocabulary),
+                             1 / (1 + vocabulary.hypernym_distances[real]), synset_count)
+    features = _stack_columns(definitions, hypernyms)
+
+    # Inverse document frequency weighting
+    indptr, indices, values = features
+    document_frequency = np.bincount(indices)
+    values = values * np.log(synset_count / document_frequency[indices]).astype(np.float32)
+    features = indptr, indices, values
+
+    synset_vectors = _normalize(_randomized_svd(features, len(engine.store.vocabulary) + synset_count, DIMENSIONS))
+
+    # A lemma's vector is the sum of the vectors of its synsets (of all parts of speech)
+    lemma_synsets = [vocabulary.lemma_synsets[pos] for pos in WordNetSnapshot.POS_LIST]
+    lemma_synsets = _stack_columns(*[(indptr, indices, np.ones(len(indices), dtype=np.float32))
+                                     for indptr, indices in lemma_synsets])
+    lemma_vectors = _normalize(_dot(lemma_synsets, synset_vectors))
+
+    centroids, clusters = _cluster(lemma_vectors, CLUSTERS)
+    lemma_order = np.argsort(clusters, kind="stable")
+    cluster_indptr = np.zeros(CLUSTERS + 1, dtype=np.int64)
+    cluster_indptr[1:] = np.cumsum(np.bincount(clusters, minlength=CLUSTERS))
+
+    # Write to a temporary folder of this process and move it at once, so no one reads partially written vectors
+    temp_folder = "%s.tmp%s" % (folder, os.getpid())
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    os.makedirs(temp_folder)
+    for name, array in zip(ARRAY_FILES, [synset_vectors, lemma_vectors[lemma_order], lemma_order, cluster_indptr,
+                                         centroids]):
+        np.save(os.path.join(temp_folder, name), array)
+    LemmaIndex.replace_folder(temp_folder, folder)
+
+
+def _randomized_svd(matrix, columns, dimensions):
+    """
+    Returns the left singular vectors of a sparse (CSR) matrix, scaled by their singular values, for the given number
+    of largest singular values. They are found in a random subspace that is refined by a few power iterations (see
+    Halko, Martinsson and Tropp, "Finding structure with randomness").
+    """
+    transposed = _transpose(matrix, columns)
+    random = np.random.default_rng(0)
+    basis = _orthonormal(_dot(matrix, random.standard_normal((columns, dimensions + OVERSAMPLING), dtype=np.float32)))
+    for _ in range(POWER_ITERATIONS):
+        basis = _orthonormal(_dot(matrix, _orthonormal(_dot(transposed, basis))))
+
+    # The matrix projected on the basis is small enough for a dense SVD
+    u, s, _ = np.linalg.svd(_dot(transposed, basis).T, full_matrices=False)
+    return (basis @ u[:, :dimensions] * s[:dimensions]).astype(np.float32)
+
+
+def _cluster(vectors, clusters):
+    """
+    Clusters the (normalized) vectors by spherical k-means, and returns the normalized centroids and the cluster of
+    each vector
+    """
+    random = np.random.default_rng(0)
+    centroids = vectors[random.choice(len(vectors), clusters, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _nearest_centroids(vectors, centroids)
+        order = np.argsort(assignment, kind="stable")
+        sizes = np.bincount(assignment, minlength=clusters)
+        starts = np.cumsum(sizes) - sizes
+        nonempty = sizes > 0
+
+        # Empty clusters keep their old centroids
+        centroids = centroids.copy()
+        centroids[nonempty] = _normalize(np.add.reduceat(vectors[order], starts[nonempty], axis=0))
+
+    return centroids, _nearest_centroids(vectors, centroids)
+
+
+def _nearest_centroids(vectors, centroids):
+    """
+    Returns the index of the centroid closest to each vector
+    """
+    return np.concatenate([np.argmax(vectors[start:start + CHUNK_ROWS] @ centroids.T, axis=1)
+                           for start in range(0, len(vectors), CHUNK_ROWS)])
+
+
+def _dot(matrix, dense):
+    """
+    Returns the product of a sparse (CSR) matrix and a dense one, computed a chunk of rows (with about CHUNK_ENTRIES
+    entries) at a time
+    """
+    indptr, indices, values = matrix
+    result = np.zeros((len(indptr) - 1, dense.shape[1]), dtype=np.float32)
+    start = 0
+    while start < len(indptr) - 1:
+        end = max(start + 1, np.searchsorted(indptr, indptr[start] + CHUNK_ENTRIES, side="right") - 1)
+        row_indptr = indptr[start:end + 1]
+        products = values[row_indptr[0]:row_indptr[-1], None] * dense[indices[row_indptr[0]:row_indptr[-1]]]
+        nonempty = np.flatnonzero(row_indptr[:-1] < row_indptr[1:])
+        if len(nonempty) > 0:
+            result[start + nonempty] = np.add.reduceat(products, row_indptr[nonempty] - row_indptr[0], axis=0)
+        start = end
+
+    return result
+
+
+def _transpose(matrix, columns):
+    """
+    Returns the transpose of a sparse (CSR) matrix with the given number of columns, in CSR form
+    """
+    indptr, indices, values = matrix
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    return _rows_to_csr(indices, rows, values, columns)
+
+
+def _stack_columns(*matrices):
+    """
+    Returns a sparse (CSR) matrix with the rows of all the given matrices (with the same number of rows) joined
+    """
+    rows = np.concatenate([np.repeat(np.arange(len(indptr) - 1), np.diff(indptr)) for indptr, _, _ in matrices])
+    indices = np.concatenate([indices for _, indices, _ in matrices])
+    values = np.concatenate([values for _, _, values in matrices])
+    return _rows_to_csr(rows, indices, values, len(matrices[0][0]) - 1)
+
+
+def _rows_to_csr(rows, indices, values, row_count):
+    """
+    Returns the CSR form of a sparse matrix given by the row, column index and value of each of its entries
+    """
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(row_count + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=row_count))
+    return indptr, np.asarray(indices, dtype=np.int64)[order], np.asarray(values, dtype=np.float32)[order]
+
+
+def _orthonormal(dense):
+    """
+    Returns an orthonormal basis of the columns of the dense matrix
+    """
+    q, _ = np.linalg.qr(dense)
+    return q
+
+
+def _normalize(vectors):
+    """
+    Returns the vectors divided by their norms (vectors of zeros are left as they are)
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+if __name__ == "__main__":
+    # Offline build step, so the first solved clue doesn't pay for it
+    get_vectors()
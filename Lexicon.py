@@ -0,0 +1,160 @@
+"""
+This file loads the word lists (abbreviations and indicator words) used by the grammar and the solvers.
+Each list is read only once per process and kept in an immutable structure shared by all modules. If the files in the
+word lists folder change, reload() makes the next lookups read them again.
+The entries of the lists can be phrases of several words (e.g. "all over the place"). A PhraseMatcher finds all the
+entries of several lists in a clue in a single scan of its words.
+"""
+
+
+import collections
+import hashlib
+import os
+import os.path
+import types
+
+FOLDER = "Word lists"
+ABBREVIATION_FILE = "ABBR.txt"
+ABBR_SEP = "---"
+ABBREVIATIONS = "ABBR"      # name of the words that can be abbreviated, when matched with the word lists
+
+# Incremented on every reload, so modules that compile something from the lists know when to do it again
+version = 0
+
+_abbreviations = None
+_word_lists = {}
+_matchers = {}
+
+
+class PhraseMatcher:
+    """
+    Object that finds all the occurrences of a set of phrases in a list of words, in a single scan (an Aho-Corasick
+    automaton over words rather than letters). Each phrase has the names of the word lists it's in.
+    States are numbered, and each state has its transitions by word, its failure state (the state of the longest proper
+    suffix of its phrase prefix that is also a prefix) and the phrases that end in it (as pairs of length and names).
+    """
+
+    def __init__(self, phrases):
+        self._transitions = [{}]
+        self._failures = [0]
+        self._outputs = [[]]
+
+        # A trie of all the phrases
+        for phrase, names in phrases.items():
+            state = 0
+            for word in phrase:
+                if word not in self._transitions[state]:
+                    self._transitions[state][word] = len(self._transitions)
+                    self._transitions.append({})
+                    self._failures.append(0)
+                    self._outputs.append([])
+                state = self._transitions[state][word]
+            self._outputs[state].append((len(phrase), tuple(names)))
+
+        # Failure states in breadth-first order, so the failure state of each state's parent is already known
+        queue = collections.deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._transitions[state].items():
+                failure = self._failures[state]
+                while failure and word not in self._transitions[failure]:
+                    failure = self._failures[failure]
+                self._failures[child] = self._transitions[failure].get(word, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._failures[child]]
+                queue.append(child)
+
+    def find(self, words):
+        """
+        Returns a list of (start, end, name) for each occurrence of a phrase of the word list with the given name in
+        the words (the phrase is words[start:end])
+        """
+        matches = []
+        state = 0
+        for end, word in enumerate(words, 1):
+            while state and word not in self._transitions[state]:
+                state = self._failures[state]
+            state = self._transitions[state].get(word, 0)
+            for length, names in self._outputs[state]:
+                matches.extend((end - length, end, name) for name in names)
+
+        return matches
+
+
+def get_abbreviations():
+    """
+    Returns a read-only dictionary from each word that can be abbreviated to a tuple of all its abbreviations (in the
+    order they appear in the abbreviation file)
+    """
+    global _abbreviations
+    if _abbreviations is None:
+        abbreviations = {}
+        for line in _read_lines(ABBREVIATION_FILE):
+            word, abbreviation = line.split(ABBR_SEP)
+            abbreviations.setdefault(word.lower(), [])
+            if abbreviation not in abbreviations[word.lower()]:
+                abbreviations[word.lower()].append(abbreviation)
+
+        _abbreviations = types.MappingProxyType({word: tuple(abbreviations[word]) for word in abbreviations})
+
+    return _abbreviations
+
+
+def get_word_list(name):
+    """
+    Returns a tuple of the (lower case) words in the word list with the given name (e.g. "ANAG_IDT"), without
+    duplicates
+    """
+    if name not in _word_lists:
+        words = [line.lower() for line in _read_lines(name + ".txt")]
+        _word_lists[name] = tuple(dict.fromkeys(words))
+
+    return _word_lists[name]
+
+
+def get_matcher(names):
+    """
+    Returns a PhraseMatcher of the entries of the word lists with the given names (ABBREVIATIONS stands for the words
+    that can be abbreviated)
+    """
+    names = tuple(names)
+    if names not in _matchers:
+        phrases = {}
+        for name in names:
+            words = get_abbreviations().keys() if name == ABBREVIATIONS else get_word_list(name)
+            for word in words:
+                phrases.setdefault(tuple(word.split()), []).append(name)
+        _matchers[names] = PhraseMatcher(phrases)
+
+    return _matchers[names]
+
+
+def fingerprint():
+    """
+    Returns a hash of the contents of all the files in the word lists folder, which changes whenever any list changes
+    """
+    digest = hashlib.sha1()
+    for file_name in sorted(os.listdir(FOLDER)):
+        digest.update(file_name.encode("utf-8"))
+        with open(os.path.join(FOLDER, file_name), "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def reload():
+    """
+    Drops all loaded word lists, so they are read from the files again on their next use
+    """
+    global _abbreviations, version
+    _abbreviations = None
+    _word_lists.clear()
+    _matchers.clear()
+    version += 1
+
+
+def _read_lines(file_name):
+    """
+    Returns all the non-empty lines in the given file from the word lists folder
+    """
+    with open(os.path.join(FOLDER, file_name), "r") as f:
+        return [line for line in f.read().splitlines() if line.strip()]
@@ -0,0 +1,95 @@
+"""
+This file holds a bounded cache for WordNet path similarity between pairs of synsets.
+The same pairs come up again and again (for all the candidates of one clue and for different clues), so computed
+similarities are kept with least-recently-used eviction. The cache can be saved to a file and loaded in a later run.
+"""
+
+
+import collections
+import os
+import os.path
+import pickle
+
+DEFAULT_MAX_SIZE = 500000
+
+
+class PathSimilarityCache:
+    """
+    Object that holds path similarities of synset pairs, keyed by the names of both synsets.
+    Path similarity is symmetric, so each pair is kept once no matter the order of the synsets.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._similarities = collections.OrderedDict()
+
+    def path_similarity(self, synset1, synset2):
+        """
+        Returns the path similarity of the two synsets (None if no path connects them), computing it only if it's not
+        in the cache
+        """
+        key = _get_key(synset1.name(), synset2.name())
+        if key in self._similarities:
+            self.hits += 1
+            self._similarities.move_to_end(key)
+            return self._similarities[key]
+
+        self.misses += 1
+        similarity = synset1.path_similarity(synset2)
+        self._add(key, similarity)
+        return similarity
+
+    def clear(self):
+        """
+        Removes all pairs from the cache and resets the counters
+        """
+        self._similarities.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path):
+        """
+        Adds the pairs saved in the given file to the cache (if the file exists)
+        """
+        if not os.path.exists(path):
+            return
+
+        with open(path, "rb") as f:
+            for key, similarity in pickle.load(f):
+                self._add(key, similarity)
+
+    def save(self, path):
+        """
+        Saves all the pairs in the cache to the given file, from least to most recently used
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(list(self._similarities.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def __len__(self):
+        return len(self._similarities)
+
+    def __str__(self):
+        return "%s pairs, %s hits, %s misses" % (len(self), self.hits, self.misses)
+
+    def _add(self, key, similarity):
+        """
+        Adds a pair to the cache, evicting the least recently used pairs if the cache is full
+        """
+        self._similarities[key] = similarity
+        self._similarities.move_to_end(key)
+        while len(self._similarities) > self.max_size:
+            self._similarities.popitem(last=False)
+
+
+def _get_key(name1, name2):
+    if name1 <= name2:
+        return name1, name2
+    else:
+        return name2, name1
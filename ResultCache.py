@@ -0,0 +1,146 @@
+"""
+This file holds a persistent cache of the solutions of whole clues, in an SQLite database.
+Clues are keyed by their normalized words and solution format, so a clue that was already solved (in this run or in an
+earlier one) is answered without parsing or scoring. The cache keeps a bounded number of clues, evicting the least
+recently used ones, and is emptied when the word lists, the WordNet version or the solver's cache version change.
+"""
+
+
+import json
+import Lexicon
+import os
+import os.path
+import sqlite3
+import time
+import LemmaIndex
+import WordNetSnapshot
+
+CACHE_FILE = os.path.join(LemmaIndex.INDEX_FOLDER, "results.sqlite")
+DEFAULT_MAX_ENTRIES = 100000
+
+# Increment when a change to the solvers changes their results, so solutions cached by older versions are dropped
+CACHE_VERSION = 7
+
+_cache = None
+
+
+class ResultCache:
+    """
+    Object that stores and looks up the solutions of clues in an SQLite database.
+    Only the complete solutions of clues should be cached (not the ones of a search that was cut by a budget, see
+    ClueSolver.solve_with_budget).
+    """
+
+    def __init__(self, path=CACHE_FILE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                     "(key TEXT PRIMARY KEY, solutions TEXT, last_used REAL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+        # Drop all the solutions if anything they depend on has changed
+        fingerprint = get_fingerprint()
+        row = self._connection.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            with self._connection:
+                self._connection.execute("DELETE FROM results")
+                self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+
+        self._size = self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, clue, solution_format):
+        """
+        Returns the cached solutions of the clue (a list of words) with the given format, or None if the clue is not in
+        the cache
+        """
+        key = get_key(clue, solution_format)
+        row = self._connection.execute("SELECT solutions FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self._connection:
+            self._connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [(word, score) for word, score in json.loads(row[0])]
+
+    def put(self, clue, solution_format, solutions):
+        """
+        Caches the solutions of the clue with the given format, evicting the least recently used clues if the cache is
+        full
+        """
+        key = get_key(clue, solution_format)
+        with self._connection:
+            exists = self._connection.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+            self._connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                     (key, json.dumps(solutions), time.time()))
+            if not exists:
+                self._size += 1
+
+            if self._size > self.max_entries:
+                self._connection.execute("DELETE FROM results WHERE key IN "
+                                         "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                                         (self._size - self.max_entries,))
+                self._size = self.max_entries
+
+    def clear(self):
+        """
+        Removes all clues from the cache and resets the counters
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM results")
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self._connection.close()
+
+    def __len__(self):
+        return self._size
+
+    def __str__(self):
+        return "%s clues, %s hits, %s misses" % (len(self), self.hits, self.misses)
+
+
+def get_cache():
+    """
+    Returns the result cache in the default path (opened once per process)
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+
+    return _cache
+
+
+def get_key(clue, solution_format):
+    """
+    Returns the key of a clue (a list of words) with the given solution format (or None): the normalized words of the
+    clue, the length of each word of the solution and the known letters
+    """
+    words = [word.lower() for word in clue if word]
+    if solution_format is None:
+        lengths = None
+        letters = None
+    else:
+        lengths = list(solution_format.lengths)
+        letters = sorted([i, j, letter] for (i, j), letter in solution_format.letters.items())
+
+    return json.dumps([words, lengths, letters])
+
+
+def get_fingerprint():
+    """
+    Returns a string that changes whenever the cached solutions may become wrong: when the word lists, the WordNet
+    version or the cache version change
+    """
+    return "%s-%s-%s" % (CACHE_VERSION, WordNetSnapshot.get_version(), Lexicon.fingerprint())
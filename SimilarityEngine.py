@@ -0,0 +1,392 @@
+"""
+This file holds a vectorized engine for scoring the entire WordNet vocabulary as solutions to a clue.
+The hypernym structure of all synsets (used for path similarity) is precomputed once into NumPy arrays in CSR form
+(row pointers, column indices and values), and the words of all synset definitions (used for Lesk) are taken from the
+DefinitionStore in the same form. Scoring all lemmas against a clue then takes a few array operations per clue synset
+instead of a Python loop over all lemmas.
+The scores are the same as the ones given by SimilaritySolver._give_score and combined by
+SimilaritySolver._combine_scores.
+"""
+
+
+import collections
+import DefinitionStore
+import os.path
+import numpy as np
+from nltk.corpus import wordnet as wn
+import LemmaIndex
+import WordNetSnapshot
+from WordNetSnapshot import NOUN, VERB, ADJ, ADV, POS_LIST
+
+ENGINE_FILE = "similarity_engine_%s.pickle"
+MAX_SLICES = 32
+
+_engine = None
+
+
+class SimilarityEngine:
+    """
+    Object that holds the precomputed WordNet arrays and scores all lemmas against a clue.
+    Synsets are numbered as in the DefinitionStore. In the hypernym arrays, an extra column (numbered after
+    all synsets) stands for the fake root that WordNet adds when computing path similarity for non-noun synsets.
+    Searches for solutions of a known length (or word lengths) score only the lemmas of that length, using a
+    VocabularySlice of the arrays that is made once per length and kept for the next searches.
+    """
+
+    def __init__(self, data):
+        self.lemma_names = data["lemma_names"]
+        self.store = DefinitionStore.get_store()
+        self.synset_ids = self.store.synset_ids
+
+        # synset -> all its hypernyms (and itself), with their distance from it
+        hypernym_indptr, hypernym_indices, hypernym_distances = data["hypernyms"]
+
+        # lemma -> its synsets, for each part of speech
+        lemma_synsets = data["lemma_synsets"]
+
+        self.vocabulary = VocabularySlice(np.arange(len(self.lemma_names)), lemma_synsets,
+                                          np.arange(len(self.synset_ids)), hypernym_indptr, hypernym_indices,
+                                          hypernym_distances.astype(np.float64), self.store.indptr, self.store.words)
+
+        # lemma ids by total length and by word lengths (cheap to build, so it's not saved with the arrays)
+        self.lengths, self.patterns = LemmaIndex.build_length_index(self.lemma_names)
+        self._slices = collections.OrderedDict()
+
+    def top_scores(self, context, length=0, k=1000, pattern=None):
+        """
+        Finds the lemmas with the highest total scores as solutions to the clue, without building a score dictionary
+        for the whole vocabulary: the scores are combined in arrays, and only the best k are selected (in linear time)
+        and sorted.
+        :param context: the ClueContext of the clue.
+        :param length: the length of the wanted solution, including underscores between words (0 for any length).
+        :param k: the maximal number of lemmas to return.
+        :param pattern: the length of each word of the wanted solution (e.g. (3, 5) for "ice_cream"). If given, the
+        length is ignored.
+        :return: A list of up to k (lemma name, score) pairs of lemmas with a positive score, from highest to lowest
+        score.
+        """
+        vocabulary = self._get_slice(length, pattern)
+        scores, = self._total_scores([context], vocabulary)
+        return self._top(scores, vocabulary, k)
+
+    def top_products(self, first_context, second_context, length=0, k=1000, pattern=None, candidates=None):
+        """
+        Like top_scores, for a solution to two clues at once (e.g. the two definitions of a double synonym clue): both
+        clues are scored in the same pass over the vocabulary, and each lemma gets the product of its two scores.
+        :param candidates: If given, a sorted array of the ids of the only lemmas to score (e.g. the ones found by
+        LemmaVectors), instead of all the lemmas of the given length.
+        :return: A list of up to k (lemma name, score) pairs of lemmas with a positive score for both clues, from
+        highest to lowest product.
+        """
+        if candidates is not None:
+            vocabulary = self.vocabulary.take(candidates)
+        else:
+            vocabulary = self._get_slice(length, pattern)
+        first_scores, second_scores = self._total_scores([first_context, second_context], vocabulary)
+        return self._top(first_scores * second_scores, vocabulary, k)
+
+    def lemma_ids(self, length=0, pattern=None):
+        """
+        Returns an array of the ids of the lemmas with the given word lengths (or total length), or None for all lemmas
+        """
+        if pattern is not None:
+            return self.patterns.get(tuple(pattern), np.zeros(0, dtype=np.int64))
+        elif length != 0:
+            return self.lengths.get(length, np.zeros(0, dtype=np.int64))
+        return None
+
+    def path_similarity(self, first_name, second_name):
+        """
+        Returns the path similarity of the two synsets with the given names, as WordNet computes it (None if no path
+        connects them)
+        """
+        if first_name == second_name:
+            return 1.0
+
+        first = self._hypernyms(self.synset_ids[first_name])
+        second = self._hypernyms(self.synset_ids[second_name])
+
+        # WordNet adds the fake root to both synsets if any of them needs it
+        root = len(self.synset_ids)
+        for hypernyms in [first, second]:
+            if root not in hypernyms and (root in first or root in second):
+                hypernyms[root] = max(hypernyms.values()) + 1
+
+        distances = [distance + second[hypernym] for hypernym, distance in first.items() if hypernym in second]
+        if not distances:
+            return None
+        return 1.0 / (min(distances) + 1)
+
+    def _hypernyms(self, synset_id):
+        """
+        Returns a dictionary from the synset and all its hypernyms to their distance from it
+        """
+        start, end = self.vocabulary.hypernym_indptr[synset_id], self.vocabulary.hypernym_indptr[synset_id + 1]
+        return dict(zip(self.vocabulary.hypernym_indices[start:end].tolist(),
+                        self.vocabulary.hypernym_distances[start:end].tolist()))
+
+    def _top(self, scores, vocabulary, k):
+        """
+        Returns the k lemmas of the vocabulary slice with the highest positive scores, with their scores
+        """
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self.lemma_names[vocabulary.lemma_ids[i]], float(scores[i])) for i in candidates]
+
+    def _get_slice(self, length, pattern):
+        """
+        Returns the vocabulary slice of the lemmas with the given word lengths (or total length), making it if it
+        isn't kept yet
+        """
+        if pattern is not None:
+            key = tuple(pattern)
+            lemma_ids = self.patterns.get(key)
+        elif length != 0:
+            key = length
+            lemma_ids = self.lengths.get(key)
+        else:
+            return self.vocabulary
+
+        if key not in self._slices:
+            if lemma_ids is None:
+                lemma_ids = np.zeros(0, dtype=np.int64)
+            self._slices[key] = self.vocabulary.take(lemma_ids)
+            while len(self._slices) > MAX_SLICES:
+                self._slices.popitem(last=False)
+        self._slices.move_to_end(key)
+
+        return self._slices[key]
+
+    def _total_scores(self, contexts, vocabulary):
+        """
+        Returns an array with a row for each of the given ClueContexts and the total score of each lemma in the
+        vocabulary slice as a solution to it, combined from its path similarity scores (per part of speech) and Lesk
+        score like SimilaritySolver._combine_scores does
+        """
+        path = np.zeros((len(contexts), len(vocabulary.lemma_ids)))
+        for pos, clue_synsets in [(NOUN, [context.syn_noun for context in contexts]),
+                                  (VERB, [context.syn_verb for context in contexts]),
+                                  (ADJ, [context.syn_adj for context in contexts]),
+                                  (ADV, [context.syn_adv for context in contexts])]:
+            path = np.maximum(path, vocabulary.lemma_scores(self._path_scores(clue_synsets, vocabulary), pos))
+
+        synset_scores = np.array([self._lesk_scores(context, vocabulary) for context in contexts])
+        lesk = np.zeros((len(contexts), len(vocabulary.lemma_ids)))
+        for pos in POS_LIST:
+            lesk = np.maximum(lesk, vocabulary.lemma_scores(synset_scores, pos))
+
+        # The Lesk score replaces a missing path score, and is averaged with any other path score except a perfect 1
+        combined = np.where(path == 1, 1, (lesk + path) / 2)
+        combined = np.where(path == 0, lesk, combined)
+        return np.where(lesk > 0, combined, path)
+
+    def _path_scores(self, clue_synsets, vocabulary):
+        """
+        Returns an array with a row for each of the given lists of clue synsets, and the sum of path similarities
+        between each synset of the vocabulary slice and all the clue synsets in the list.
+        The path lengths from each distinct clue synset are computed only once, even if it's in several lists.
+        """
+        scores = np.zeros((len(clue_synsets), len(vocabulary.synset_ids)))
+        counts = [collections.Counter(self.synset_ids[synset.name()] for synset in synsets) for synsets in clue_synsets]
+
+        all_synsets = self.vocabulary
+        for synset_id in dict.fromkeys(synset_id for synset_counts in counts for synset_id in synset_counts):
+            # Distance of each hypernym of the clue synset from it (infinity for all other synsets)
+            start, end = all_synsets.hypernym_indptr[synset_id], all_synsets.hypernym_indptr[synset_id + 1]
+            distances = np.full(len(self.synset_ids) + 1, np.inf)
+            distances[all_synsets.hypernym_indices[start:end]] = all_synsets.hypernym_distances[start:end]
+
+            # The shortest path goes through the common hypernym closest to both synsets
+            path_lengths = vocabulary.hypernym_distances + distances[vocabulary.hypernym_indices]
+            shortest = _reduce_rows(path_lengths, vocabulary.hypernym_indptr, np.minimum, empty=np.inf)
+            for i, synset_counts in enumerate(counts):
+                if synset_id in synset_counts:
+                    scores[i] += synset_counts[synset_id] / (shortest + 1)     # Synsets with no path get 1 / inf = 0
+
+        return scores
+
+    def _lesk_scores(self, context, vocabulary):
+        """
+        Returns an array with the Lesk score of each synset of the vocabulary slice: the weighted overlap of its
+        definition with the clue words and with the context words
+        """
+        clue_words = np.zeros(len(self.store.vocabulary))
+        clue_words[list(context.clue_words)] = 1
+        context_words = np.zeros(len(self.store.vocabulary))
+        context_words[list(context.context_words)] = 1
+
+        clue_overlap = _reduce_rows(clue_words[vocabulary.definition_words], vocabulary.definition_indptr, np.add)
+        context_overlap = _reduce_rows(context_words[vocabulary.definition_words], vocabulary.definition_indptr,
+                                       np.add)
+
+        # give more weight to similarity to the clue
+        return 0.75 * clue_overlap / len(context.text_words) + 0.25 * context_overlap / context.num_context_words
+
+
+class VocabularySlice:
+    """
+    Object that holds the engine's arrays for a subset of the lemmas: the synsets of each lemma (numbered by their
+    position in synset_ids), and the hypernyms and definition words of these synsets only (in CSR form, like the
+    arrays of all synsets).
+    """
+
+    def __init__(self, lemma_ids, lemma_synsets, synset_ids, hypernym_indptr, hypernym_indices, hypernym_distances,
+                 definition_indptr, definition_words):
+        self.lemma_ids = lemma_ids
+        self.lemma_synsets = lemma_synsets
+        self.synset_ids = synset_ids
+        self.hypernym_indptr = hypernym_indptr
+        self.hypernym_indices = hypernym_indices
+        self.hypernym_distances = hypernym_distances
+        self.definition_indptr = definition_indptr
+        self.definition_words = definition_words
+
+    def take(self, lemma_ids):
+        """
+        Returns a new slice of the given lemmas (given by their position in this slice)
+        """
+        lemma_synsets = {}
+        for pos in POS_LIST:
+            indptr, indices = self.lemma_synsets[pos]
+            lemma_synsets[pos] = _take_rows(indptr, indices, lemma_ids)
+
+        # Renumber the synsets of the chosen lemmas by their position in the new slice
+        synsets = np.unique(np.concatenate([indices for _, indices in lemma_synsets.values()]))
+        lemma_synsets = {pos: (indptr, np.searchsorted(synsets, indices)) for pos, (indptr, indices) in
+                         lemma_synsets.items()}
+
+        hypernym_indptr, hypernym_indices, hypernym_distances = _take_rows(self.hypernym_indptr,
+                                                                           self.hypernym_indices, synsets,
+                                                                           self.hypernym_distances)
+        definition_indptr, definition_words = _take_rows(self.definition_indptr, self.definition_words, synsets)
+
+        return VocabularySlice(self.lemma_ids[lemma_ids], lemma_synsets, self.synset_ids[synsets], hypernym_indptr,
+                               hypernym_indices, hypernym_distances, definition_indptr, definition_words)
+
+    def lemma_scores(self, synset_scores, pos):
+        """
+        Returns an array with the maximal score of each lemma's synsets with the given part of speech (0 if none).
+        The synset scores can have several rows (see _reduce_rows), and so will the lemma scores.
+        """
+        indptr, indices = self.lemma_synsets[pos]
+        return np.maximum(_reduce_rows(synset_scores[..., indices], indptr, np.maximum), 0)
+
+
+def top_scores(context, length=0, k=1000, pattern=None):
+    """
+    Returns the best k WordNet lemmas (of the given length or word lengths, if given) as solutions to the clue of the
+    given context, with their scores, using the (lazily loaded) engine
+    """
+    return get_engine().top_scores(context, length, k, pattern)
+
+
+def top_products(first_context, second_context, length=0, k=1000, pattern=None, candidates=None):
+    """
+    Returns the best k WordNet lemmas (of the given length or word lengths, if given, or of the given candidates) as
+    solutions to both clues of the given contexts, with the products of their scores, using the (lazily loaded) engine
+    """
+    return get_engine().top_products(first_context, second_context, length, k, pattern, candidates)
+
+
+def get_engine():
+    """
+    Returns the similarity engine, loading its arrays from the index folder (or building them if they don't exist yet)
+    """
+    global _engine
+    if _engine is None:
+        path = os.path.join(LemmaIndex.INDEX_FOLDER, ENGINE_FILE % WordNetSnapshot.get_version())
+        _engine = SimilarityEngine(LemmaIndex.load_or_build(path, build_engine_data))
+
+    return _engine
+
+
+def build_engine_data():
+    """
+    Computes all the arrays used by the engine from WordNet
+    """
+    store = DefinitionStore.get_store()
+    synsets = [wn.synset(name) for name in store.synset_names]
+    root = len(synsets)
+
+    # Hypernyms of each synset, as in WordNet's path similarity (the fake root is needed for all but nouns)
+    hypernyms = []
+    for synset in synsets:
+        paths = _hypernym_distances(synset)
+        row = [(store.synset_ids[hypernym.name()], distance) for hypernym, distance in paths.items()]
+        if synset.pos() != NOUN:
+            row.append((root, max(paths.values()) + 1))
+        hypernyms.append(row)
+
+    # Synsets of each lemma
+    lemma_names = list(wn.all_lemma_names(lang='eng'))
+    lemma_synsets = {}
+    for pos in POS_LIST:
+        lemma_synsets[pos] = _to_csr([[store.synset_ids[synset.name()] for synset in wn.synsets(lemma, pos=pos)]
+                                      for lemma in lemma_names])
+
+    indptr, indices = _to_csr([[hypernym for hypernym, _ in row] for row in hypernyms])
+    distances = np.array([distance for row in hypernyms for _, distance in row], dtype=np.int16)
+
+    return {"lemma_names": lemma_names,
+            "hypernyms": (indptr, indices, distances),
+            "lemma_synsets": lemma_synsets}
+
+
+def _hypernym_distances(synset):
+    """
+    Returns a dictionary from the synset and all its hypernyms to their shortest distance from the synset
+    """
+    queue = collections.deque([(synset, 0)])
+    distances = {}
+    while queue:
+        current, distance = queue.popleft()
+        if current in distances:
+            continue
+        distances[current] = distance
+        queue.extend((hypernym, distance + 1) for hypernym in current.hypernyms())
+        queue.extend((hypernym, distance + 1) for hypernym in current.instance_hypernyms())
+
+    return distances
+
+
+def _to_csr(rows):
+    """
+    Converts a list of lists of column indices to CSR row pointers and column indices arrays
+    """
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.array([column for row in rows for column in row], dtype=np.int32)
+    return indptr, indices
+
+
+def _take_rows(indptr, values, rows, *more_values):
+    """
+    Returns the CSR row pointers and values (and the same rows of more value arrays, if given) of only the given rows
+    """
+    lengths = indptr[rows + 1] - indptr[rows]
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    new_indptr[1:] = np.cumsum(lengths)
+    positions = np.repeat(indptr[rows] - new_indptr[:-1], lengths) + np.arange(new_indptr[-1])
+
+    return (new_indptr, values[positions]) + tuple(array[positions] for array in more_values)
+
+
+def _reduce_rows(values, indptr, ufunc, empty=0):
+    """
+    Reduces the values of each CSR row with the given ufunc (e.g. np.add, np.maximum). Empty rows get the empty value.
+    The values can have more dimensions, in which case the CSR rows are along the last one.
+    """
+    result = np.full(values.shape[:-1] + (len(indptr) - 1,), empty, dtype=np.float64)
+    nonempty = indptr[:-1] < indptr[1:]
+    if values.shape[-1] > 0:
+        result[..., nonempty] = ufunc.reduceat(values, indptr[:-1][nonempty], axis=-1)
+
+    return result
+
+
+if __name__ == "__main__":
+    # Offline build step, so the first solved clue doesn't pay for it
+    get_engine()
@@ -1,9 +1,70 @@
-from nltk.corpus import wordnet as wn, stopwords
 from nltk.tokenize import word_tokenize
+import DefinitionStore
+import Instrumentation
+import LemmaIndex
+import LemmaVectors
+import os.path
+import PathSimilarityCache
 import re
+import SimilarityEngine
+import WordNetSnapshot
+from WordNetSnapshot import NOUN, VERB, ADJ, ADV
 
+PATH_CACHE_FILE = os.path.join(LemmaIndex.INDEX_FOLDER, "path_similarity_cache.pickle")
+MAX_SOLUTIONS = 1000
+DOUBLE_CANDIDATES = 2000   # lemmas nearest to each clue of a double synonym that are scored (see LemmaVectors)
 
-def solve(clue, length=0, solution = "", indicator=True):
+# Path similarities of synset pairs, shared by all clues (see load_path_cache and save_path_cache)
+path_cache = PathSimilarityCache.PathSimilarityCache()
+
+
+class ClueContext:
+    """
+    Object that holds all the information about a clue that is needed to score possible solutions to it: the non
+    functional words of the clue, their synsets (all of them and per part of speech) and the context words from the
+    definitions of these synsets. It is created once per clue and reused for every candidate solution.
+    Words are kept as their ids in the DefinitionStore, so they can be compared directly with stored definitions.
+    """
+
+    def __init__(self, clue):
+        self.clue = clue
+
+        text_words = word_tokenize(clue)  # tokenize the clue
+        temp_words = list(set(text_words) - WordNetSnapshot.get_stop_words())  # remove functional words
+        if len(temp_words) != 0:
+            text_words = temp_words
+        self.text_words = text_words
+
+        # create array of all synsets of the context words
+        self.syn = self._get_synsets()
+        self.syn_verb = self._get_synsets(VERB)
+        self.syn_noun = self._get_synsets(NOUN)
+        self.syn_adj = self._get_synsets(ADJ)
+        self.syn_adv = self._get_synsets(ADV)
+
+        # collect the words of the definitions of all the synsets of all the non functional words in the clue
+        # (the words are taken as ids from the definition store, which only removes the tokens that aren't words, so
+        # functional words of the definitions are kept, as they always were in the Lesk score)
+        store = DefinitionStore.get_store()
+        self.clue_words = store.get_word_ids(self.text_words)
+        self.context_words = set()
+        self.num_context_words = 0
+        for i, val in enumerate(self.syn):
+            self.context_words.update(store.definition_words(val))
+            self.num_context_words += store.word_count(val)
+
+    def _get_synsets(self, pos=None):
+        """
+        Returns all the synsets of the clue's words with the given part of speech (all synsets if pos is None)
+        """
+        syn = []
+        for i, val in enumerate(self.text_words):
+            syn.extend(WordNetSnapshot.synsets(val, pos=pos))
+
+        return syn
+
+
+def solve(clue, length=0, solution = "", indicator=True, pattern=None):
     """
     Return a sorted list of words and their score that are possible solutions to the clue given.
     The length of word, when given, is used as a filtering factor.
@@ -11,61 +72,118 @@ def solve(clue, length=0, solution = "", indicator=True):
     :param clue: The clue we want to give solutions.
     :param length: The length of the solution.
     :param solution: A given solution to the clue
+    :param pattern: The length of each word of the solution (replaces the length when searching for solutions).
     :return: A list of words and their scores as solutions to the clue or, given a solution, it's score as a
     solution to the clue.
     """
-    stop_words = set(stopwords.words("english"))
-    text_words = word_tokenize(clue)  # tokenize the clue
-    temp_words = list(set(text_words) - stop_words)  # remove functional words
-    if len(temp_words) != 0:
-        text_words = temp_words
-    syn = []
+    with Instrumentation.stage("similarity"):
+        context = ClueContext(clue)
 
-    # create array of all synsets of the context words
-    for i, val in enumerate(text_words):
-        syn.extend(wn.synsets(val))
+    if solution:  # We only want to check one word similarity, which is given as an argument.
+        return score_candidates(context, [solution], length, indicator)[0]
 
-    syn_verb = []
-    for i, val in enumerate(text_words):
-        syn_verb.extend(wn.synsets(val, pos=wn.VERB))
+    # check if any synsets found
+    if len(context.syn) == 0:
+        return 0
 
-    syn_noun = []
-    for i, val in enumerate(text_words):
-        syn_noun.extend(wn.synsets(val, pos=wn.NOUN))
+    # score all the values in the database at once, and keep only the best ones
+    Instrumentation.count("vocabulary_scans")
+    with Instrumentation.stage("similarity"):
+        return SimilarityEngine.top_scores(context, length, MAX_SOLUTIONS, pattern)
 
-    syn_adj = []
-    for i, val in enumerate(text_words):
-        syn_adj.extend(wn.synsets(val, pos=wn.ADJ))
 
-    syn_adv = []
-    for i, val in enumerate(text_words):
-        syn_adv.extend(wn.synsets(val, pos=wn.ADV))
+def solve_double(first_clue, second_clue, length=0, pattern=None):
+    """
+    Return a sorted list of words that are possible solutions to both clues given (e.g. the two definitions of a
+    double synonym clue), with the product of their scores as solutions to each clue.
+    Only the DOUBLE_CANDIDATES lemmas nearest to each clue (found by their vectors, see LemmaVectors) are scored, in
+    one pass for both clues.
+    :param length: The length of the solution.
+    :param pattern: The length of each word of the solution (replaces the length).
+    """
+    with Instrumentation.stage("similarity"):
+        first_context = ClueContext(first_clue)
+        second_context = ClueContext(second_clue)
 
     # check if any synsets found
-    if len(syn) == 0:
-        return 0
-    context_words = []
+    if len(first_context.syn) == 0 or len(second_context.syn) == 0:
+        return []
+
+    with Instrumentation.stage("similarity"):
+        lemma_ids = SimilarityEngine.get_engine().lemma_ids(length, pattern)
+        candidates = LemmaVectors.get_vectors().nearest_lemmas([first_context.syn, second_context.syn],
+                                                               DOUBLE_CANDIDATES, lemma_ids)
+        Instrumentation.count("similarity_calls", len(candidates))
+        return SimilarityEngine.top_products(first_context, second_context, length, MAX_SOLUTIONS, pattern,
+                                             candidates)
 
-    # iterate over all the synsets of all the non functional words in the clue
-    # tokenize the definitions and remove all the functional words
-    for i, val in enumerate(syn):
-        words = word_tokenize(val.definition())
-        context_words.extend(words)
 
-    # this is a list of all the context words of all the definitions of all the synsets
-    # of all the context words in the clue
-    #context_words = list(set(context_words) - stop_words)
-    context_words = _remove_non_alphabet(context_words)
+def nearest_phrases(clue, phrases, count):
+    """
+    Return the count phrases (words separated by spaces) nearest in meaning to the clue, from the nearest, by their
+    vectors (see LemmaVectors). This is much faster than scoring the phrases, so it picks the ones worth scoring.
+    :param phrases: A list of phrases.
+    :param count: The number of phrases to return.
+    """
+    with Instrumentation.stage("similarity"):
+        synsets = ClueContext(clue).syn
+        return LemmaVectors.get_vectors().nearest_phrases(synsets, phrases, count)
 
-    iteration_list = []
 
-    if solution:  # We only want to check one word similarity, which is given as an argument.
-        iteration_list.append(solution)
-    else:
-        iteration_list = list(wn.all_lemma_names(lang='eng'))
+def score_candidates(context, candidates, length=0, indicator=True):
+    """
+    Return the score of each of the given candidates as a solution to the clue.
+    All the clue-side work is taken from the given context, so only the candidates themselves are processed.
+    :param context: The ClueContext of the clue.
+    :param candidates: A list of possible solutions (WordNet form, with underscores instead of spaces).
+    :param length: The length of the solution.
+    :return: A list of the scores, in the same order as the candidates.
+    """
+    # check if any synsets found
+    if len(context.syn) == 0:
+        return [0 for candidate in candidates]
+
+    Instrumentation.count("similarity_calls", len(candidates))
+    with Instrumentation.stage("similarity"):
+        tot_rank = _combine_scores(*_give_score(candidates, length, context))
+        scores = [tot_rank.get(candidate, 0) for candidate in candidates]
+
+        if len(context.clue.split()) == 1 and indicator:
+            # Score the other way around as well, since a one word clue might itself be the synonym of the solution
+            scores = [max(solve(candidate, length, context.clue, False), score) for candidate, score in
+                      zip(candidates, scores)]
+
+    return scores
+
+
+def warm_up():
+    """
+    Loads the WordNet snapshot (with the stop words), the definition store, the similarity engine and the lemma vectors
+    """
+    WordNetSnapshot.get_snapshot()
+    SimilarityEngine.get_engine()
+    LemmaVectors.get_vectors()
+
+
+def load_path_cache(path=PATH_CACHE_FILE):
+    """
+    Warm starts the path similarity cache with the pairs saved by a previous run
+    """
+    path_cache.load(path)
+
+
+def save_path_cache(path=PATH_CACHE_FILE):
+    """
+    Saves the path similarity cache, so the next run can start with it
+    """
+    path_cache.save(path)
 
-    # iterate over all the values in the database
-    output_noun, output_verb, output_adj, output_adv, output_lesk = _give_score(iteration_list, length, context_words, text_words, syn, syn_noun, syn_verb, syn_adj, syn_adv)
+
+def _combine_scores(output_noun, output_verb, output_adj, output_adv, output_lesk):
+    """
+    Combines the path similarity scores of all parts of speech and the Lesk score into one score for each word.
+    :return: A dictionary from each word to its total score.
+    """
     lesk = sorted(output_lesk, key=output_lesk.__getitem__, reverse=True)
 
     tot_rank1 = {k: max(i for i in (output_verb.get(k), output_noun.get(k)) if i) for k in
@@ -87,19 +205,7 @@ def solve(clue, length=0, solution = "", indicator=True):
         else:
             tot_rank[w] = (output_lesk[w] + tot_rank[w])/2
 
-    if solution:  # If we just want the score for the word as a solution to the clue.
-        try:
-            score = tot_rank[solution]
-        except KeyError:
-            score = 0
-        if len(clue.split()) == 1 and indicator:
-            symmetric_score = solve(solution, length, clue, False)
-            return max(symmetric_score, score)
-        else:
-            return score
-    rank = list(tot_rank.items())
-
-    return sorted(rank, key=lambda x: x[1], reverse=True)[:1000]
+    return tot_rank
 
 
 def _remove_non_alphabet(word_list):
@@ -116,18 +222,18 @@ def _remove_non_alphabet(word_list):
     return update_word_list
 
 
-def _give_score(word_list, length, context_words, clue_tokens, clue_syns, syn_noun, syn_verb, syn_adj, syn_adv):
+def _give_score(word_list, length, context):
     """
     Gives two scores to each word in the word list: One score is the path similarity on WordNet and the other
     score is the Lesk algorithm score.
     :param word_list: the list of words to gives scores as solutions.
     :param length: the length of the wanted solution.
-    :param context_words: a list of context words from the clue's synsets.
-    :param clue_tokens: the list of non-stop words from the clue.
-    :param clue_syns: a list of synsets from the clue.
+    :param context: the ClueContext of the clue.
     :return: Two dictionaries: One holds the score using path similarity for each words and the other holds the
     score using Lesk for each word.
     """
+    store = DefinitionStore.get_store()
+
     output_verb = {}
     output_adj = {}
     output_adv = {}
@@ -144,41 +250,41 @@ def _give_score(word_list, length, context_words, clue_tokens, clue_syns, syn_no
 
             # iterate over all the synsets for every value and calculate the similarity between
             # the synset and the synsets from the clues
-            for synset in list(wn.synsets(obj, pos=wn.VERB)):
+            for synset in list(WordNetSnapshot.synsets(obj, pos=VERB)):
                 temp = 0
-                for i, val in enumerate(syn_verb):
-                    temp = temp + synset.path_similarity(val)
+                for i, val in enumerate(context.syn_verb):
+                    temp = temp + path_cache.path_similarity(synset, val)
                 sim_verb = max(temp, sim_verb)
-            for synset in list(wn.synsets(obj, pos=wn.NOUN)):
+            for synset in list(WordNetSnapshot.synsets(obj, pos=NOUN)):
                 temp = 0
-                for i, val in enumerate(syn_noun):
-                    temp = temp + synset.path_similarity(val)
+                for i, val in enumerate(context.syn_noun):
+                    temp = temp + path_cache.path_similarity(synset, val)
                 sim_noun = max(temp, sim_noun)
-            for synset in list(wn.synsets(obj, pos=wn.ADJ)):
+            for synset in list(WordNetSnapshot.synsets(obj, pos=ADJ)):
                 temp = 0
-                for i, val in enumerate(syn_adj):
-                    if synset.path_similarity(val):
-                        temp = temp + synset.path_similarity(val)
+                for i, val in enumerate(context.syn_adj):
+                    similarity = path_cache.path_similarity(synset, val)
+                    if similarity:
+                        temp = temp + similarity
                 sim_adj = max(temp, sim_adj)
-            for synset in list(wn.synsets(obj, pos=wn.ADV)):
+            for synset in list(WordNetSnapshot.synsets(obj, pos=ADV)):
                 temp = 0
-                for i, val in enumerate(syn_adv):
-                    if synset.path_similarity(val):
-                        temp = temp + synset.path_similarity(val)
+                for i, val in enumerate(context.syn_adv):
+                    similarity = path_cache.path_similarity(synset, val)
+                    if similarity:
+                        temp = temp + similarity
                 sim_adv = max(temp, sim_adv)
 
             # iterate over all the synsets for every value and find the definition.
             # Then calculate and find 2 intersections:
             # 1. between the definition and the words from the original clue
             # 2. between the defintion and the context words array above.
-            for synset in list(wn.synsets(obj)):
-                def_words = word_tokenize(synset.definition())
-                def_words = list(set(def_words))
-                def_words = _remove_non_alphabet(def_words)
-                temp1 = set(clue_tokens).intersection(def_words)
-                temp2 = set(context_words).intersection(def_words)
-                temp1 = len(temp1) / len(clue_tokens)
-                temp2 = len(temp2) / len(context_words)
+            for synset in list(WordNetSnapshot.synsets(obj)):
+                def_words = store.definition_words(synset)
+                temp1 = context.clue_words.intersection(def_words)
+                temp2 = context.context_words.intersection(def_words)
+                temp1 = len(temp1) / len(context.text_words)
+                temp2 = len(temp2) / context.num_context_words
                 t = 0.75 * temp1 + 0.25 * temp2 # give more weight to similarity to the clue
                 sim = max(t, sim)
 
@@ -1,3 +1,6 @@
+import re
+
+
 class SolutionFormat:
     """"
     Object that represents the known format of a solution to a clue. It includes the number of words and the length of
@@ -10,6 +13,11 @@ class SolutionFormat:
         self.total = sum(lengths)
         self.letters = self._parse_format(solution_format)
 
+        # Start and end of each word in a string of all the letters of the solution (without spaces)
+        ends = [sum(lengths[:i + 1]) for i in range(len(lengths))]
+        self._bounds = list(zip([0] + ends[:-1], ends))
+        self._match = self._compile().fullmatch
+
     def _parse_format(self, solution_format):
         """
         Function that parses a given format. The format is given as a string containing '_' (underscore) for unknown
@@ -41,6 +49,23 @@ class SolutionFormat:
 
         return letters
 
+    def _compile(self):
+        """
+        Compiles the format into a regular expression that matches the solution both with and without spaces between
+        the words
+        """
+        words = []
+        for i in range(self.num_of_words):
+            word = ""
+            for j in range(self.lengths[i]):
+                if (i, j) in self.letters:
+                    word += re.escape(self.letters[(i, j)])
+                else:
+                    word += "[^ ]"
+            words.append(word)
+
+        return re.compile("%s|%s" % (" ".join(words), "".join(words)))
+
     def add_spaces(self, word):
         """
         Given a string this function adds spaces between words such that the string would fit the solution format.
@@ -54,45 +79,25 @@ class SolutionFormat:
             # Total length is incompatible
             return word
 
-        # Iterate over all substrings in the string and concatenate them with spaces
-        start = 0
-        end = self.lengths[0]
-        j = 1
-        spaced = ""
-
-        while j < self.num_of_words:
-            spaced += word[start:end] + " "
-            start = end
-            end = self.lengths[j]
-            j += 1
-
-        spaced += word[end:]
-        return spaced
+        return " ".join([word[start:end] for start, end in self._bounds])
 
     def check(self, word):
         """
-        Function that checks if the given word in compatible with the format
+        Function that checks if the given word in compatible with the format (the word can be given with or without
+        spaces between its words)
         """
-        spaced = self.add_spaces(word)
-        words = spaced.split(" ")
+        return self._match(word) is not None
 
-        # Check number of words
-        if not len(words) == self.num_of_words:
-            return False
-
-        # Check each word
-        for i in range(len(words)):
-            word = words[i]
-            if not len(word) == self.lengths[i]:
-                return False
-
-            # Check that all letters are correct
-            for j in range(len(word)):
-                if (i, j) in self.letters.keys():
-                    if not word[j] == self.letters[(i, j)]:
-                        return False
-
-        return True
+    def filter(self, words, key=None):
+        """
+        Returns a list of all the given words (any iterable) that are compatible with the format, in the same order.
+        If a key function is given, it is applied to each item to get the word that is checked (like in sorted).
+        """
+        match = self._match
+        if key is None:
+            return [word for word in words if match(word) is not None]
+        else:
+            return [item for item in words if match(key(item)) is not None]
 
     def get_total_length(self, spaces=False):
         if spaces:
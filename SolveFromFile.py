@@ -1,29 +1,64 @@
-from ClueSolver import solve, MIN_SOLUTION_VALUE
+from ClueSolver import solve, warm_up, init_worker, merge_worker_caches, MIN_SOLUTION_VALUE
 from SolutionFormat import SolutionFormat
+import argparse
+import collections
+import contextlib
+import Instrumentation
+import multiprocessing
+import ResultCache
+import SimilaritySolver
 import string
+import os
 import os.path
+import sys
 import time
 
 FOLDER = "Clues"
 INPUT_FILE_NAME = "ClueList.txt"
 OUTPUT_FILE_NAME = "ClueList_Results.txt"
+PENDING_CLUES_PER_WORKER = 2
 
 
-def SolveFromFile():
-    print("Solving clues in file %s" % INPUT_FILE_NAME)
-    clues = parse_file(os.path.join(FOLDER, INPUT_FILE_NAME))
+def SolveFromFile(input_path=os.path.join(FOLDER, INPUT_FILE_NAME), output_path=os.path.join(FOLDER, OUTPUT_FILE_NAME),
+                  workers=1, timings_path=None, timing_summary=False, use_cache=True):
+    """
+    Solves all the clues in the input file and writes the results to the output file ("-" for standard input or
+    output). The clues are read, solved and written one at a time, and the output is flushed after each clue.
+    If workers > 1, the clues are solved in parallel by a pool of worker processes (the results are still written in
+    the order of the clues in the file).
+    If a timings path is given, the instrumentation record of each clue is written to it as a line of JSON. If
+    timing_summary is True, a table of the timings and counts of all clues is printed at the end.
+    If use_cache is True, clues that were already solved are taken from the result cache, and new ones are added to it.
+    """
+    # Keep the standard output for the results if they are written to it
+    messages = sys.stderr if output_path == "-" else sys.stdout
+    print("Solving clues in file %s" % input_path, file=messages)
 
-    num_of_clues = len(clues)
+    num_of_clues = 0
     found = 0
     correct = 0
     was_option = 0
 
-    path = os.path.join(FOLDER, OUTPUT_FILE_NAME)
+    instrument = timings_path is not None or timing_summary
+    if instrument:
+        Instrumentation.enable()
+    summary = Instrumentation.Summary()
+
+    SimilaritySolver.load_path_cache()
+    cache = ResultCache.get_cache() if use_cache else None
     start = time.time()
 
-    with open(path, "w", encoding="utf-8") as f:
-        for clue, solution_format, solution in clues:
-            solutions = solve(clue, solution_format)
+    with _open(input_path, "r", sys.stdin) as input_file, _open(output_path, "w", sys.stdout) as f, \
+            _open(timings_path, "w", None) as timings_file:
+        for clue, solution_format, solution, solutions in solve_clues(parse_file(input_file), workers, cache):
+            num_of_clues += 1
+            records = Instrumentation.take_records()
+            for record in records:
+                summary.add(record)
+            if timings_file is not None:
+                Instrumentation.write_json_lines(records, timings_file)
+                timings_file.flush()
+
             if solutions and solutions[0][1] > MIN_SOLUTION_VALUE:
                 # Found at least one good solution
                 found += 1
@@ -45,26 +80,112 @@ def SolveFromFile():
             else:
                 # Didn't find any solution
                 f.write("%s. No solution.\n" % " ".join(clue))
+            f.flush()
     total = time.time() - start
 
+    SimilaritySolver.save_path_cache()
+
     print("Total number of clues: %s\n"
           "Solutions found: %s (%s %% of clues))\n"
           "Correct solutions found: %s (%s%% of clues, %s%% of solutions)\n"
           "The correct solution was one of the options %s times (%s%% of clues, %s%% of solutions)\n"
           "Calculation lasted %s seconds.\n"
-          % (num_of_clues, found, 100 * found / num_of_clues, correct, 100 * correct / num_of_clues,
-             100 * correct / found, was_option, 100 * was_option / num_of_clues, 100 * was_option / found, total))
+          "Path similarity cache: %s\n"
+          "Result cache: %s\n"
+          % (num_of_clues, found, _percent(found, num_of_clues), correct, _percent(correct, num_of_clues),
+             _percent(correct, found), was_option, _percent(was_option, num_of_clues), _percent(was_option, found),
+             total, SimilaritySolver.path_cache, cache if cache is not None else "not used"), file=messages)
+    if timing_summary:
+        print(summary, file=messages)
 
 
-def parse_file(path):
+def solve_clues(clues, workers=1, cache=None):
     """
-    Parse file line by line
+    Generator that solves the given clues (tuples of clue, solution format and solution) and yields each of them with
+    its list of solutions, in the same order.
+    If workers > 1, the clues are solved by a pool of worker processes. Only a few clues per worker are sent to the
+    pool ahead of the one being yielded, so the clues are still read as they are needed.
+    If a ResultCache is given, the solutions of cached clues are taken from it, and the other clues are added to it.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        all_clues = f.readlines()
+    if workers <= 1:
+        for clue, solution_format, solution in clues:
+            solutions = cache.get(clue, solution_format) if cache is not None else None
+            if solutions is None:
+                solutions = solve(clue, solution_format)
+                if cache is not None:
+                    cache.put(clue, solution_format, solutions)
+            yield clue, solution_format, solution, solutions
+        return
+
+    warm_up()   # build any missing index once, before the workers load it
+    pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(Instrumentation.enabled,))
+    try:
+        pending = collections.deque()
+        for clue, solution_format, solution in clues:
+            solutions = cache.get(clue, solution_format) if cache is not None else None
+            if solutions is None:
+                result = pool.apply_async(_solve_clue, (clue, solution_format))
+            else:
+                result = None
+            pending.append((clue, solution_format, solution, result, solutions))
+            if len(pending) >= PENDING_CLUES_PER_WORKER * workers:
+                yield _get_result(*pending.popleft(), cache)
+
+        while pending:
+            yield _get_result(*pending.popleft(), cache)
+    finally:
+        # Close the pool (rather than terminate it) so the workers save their path similarity caches
+        pool.close()
+        pool.join()
+        merge_worker_caches()
+
+
+def _get_result(clue, solution_format, solution, result, solutions, cache):
+    """
+    Waits for the result of a clue sent to a worker process (if it wasn't cached), keeps the instrumentation records
+    made by the worker and adds the solutions to the cache
+    """
+    if result is not None:
+        solutions, records = result.get()
+        Instrumentation.add_records(records)
+        if cache is not None:
+            cache.put(clue, solution_format, solutions)
+
+    return clue, solution_format, solution, solutions
 
-    clues = [parse_line(line) for line in all_clues]
-    return clues
+
+def _solve_clue(clue, solution_format):
+    """
+    Solves a single clue in a worker process, and returns the solutions with the instrumentation records of the clue
+    """
+    solutions = solve(clue, solution_format)
+    return solutions, Instrumentation.take_records()
+
+
+def _open(path, mode, standard_stream):
+    """
+    Opens the file in the given path, or returns the standard stream (without closing it later) if the path is "-".
+    If there is no path, None is returned.
+    """
+    if path == "-":
+        return contextlib.nullcontext(standard_stream)
+    if path is None:
+        return contextlib.nullcontext(None)
+
+    return open(path, mode, encoding="utf-8")
+
+
+def _percent(part, total):
+    return 100 * part / total if total > 0 else 0
+
+
+def parse_file(f):
+    """
+    Generator that parses an open file line by line (empty lines are skipped)
+    """
+    for line in f:
+        if line.strip():
+            yield parse_line(line)
 
 
 def parse_line(line):
@@ -86,4 +207,25 @@ def parse_line(line):
     return clue, SolutionFormat(len(lengths), lengths, ""), solution
 
 
-SolveFromFile()
+def main():
+    parser = argparse.ArgumentParser(description="Solves all the clues in the input file. Each line of the file is a "
+                                                 "clue in the format: <clue> (<num of letters>) | <solution>")
+    parser.add_argument("input", nargs="?", default=os.path.join(FOLDER, INPUT_FILE_NAME),
+                        help="file of clues, or - for standard input (default: %(default)s)")
+    parser.add_argument("output", nargs="?", default=os.path.join(FOLDER, OUTPUT_FILE_NAME),
+                        help="file to write the results to, or - for standard output (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes to solve clues in parallel (default: 1)")
+    parser.add_argument("--timings", metavar="PATH",
+                        help="write the timings and candidate counts of each clue to this file, as JSON lines")
+    parser.add_argument("--timing-summary", action="store_true",
+                        help="print a table of the timings and candidate counts of all clues at the end")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="solve every clue, without looking it up in (or adding it to) the result cache")
+    args = parser.parse_args()
+
+    SolveFromFile(args.input, args.output, args.workers, args.timings, args.timing_summary, not args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+This file runs the solver as a long-running local service, so other programs can solve clues without starting a new
+process (and loading the grammar, the word lists and the indexes) for every clue.
+The service listens on a TCP port of the local host or on a Unix socket and speaks JSON lines: each request is a line
+with a JSON object, and each response is a line with a JSON object that has the id of its request. A request holds the
+clue and optionally the solution format and a timeout in seconds:
+    {"id": 1, "clue": "Bird returned to the nest", "lengths": [4], "letters": "____", "timeout": 10}
+The clue is parsed and its subproblems (see ClueSolver.get_subproblems) are solved by a pool of worker processes, which
+load everything once when the service starts. The solutions of each subproblem are sent as soon as it is solved:
+    {"id": 1, "type": "solutions", "clue_type": "REVERSE", "solutions": [["nest", 0.5], ...]}
+and then all the solutions, from best to worst (the same list ClueSolver.solve returns):
+    {"id": 1, "type": "done", "complete": true, "cached": false, "solutions": [["nest", 0.5], ...]}
+A request that isn't finished within its timeout gets a "done" response with the solutions found so far and
+"complete": false, and the workers stop solving its subproblems. When too many requests are pending, new ones are
+rejected at once with an "error" response, so the latency of the accepted requests stays bounded. A request whose
+clue can't be solved (e.g. when a worker process fails) also gets an "error" response.
+Several requests can be sent on the same connection without waiting for their responses.
+"""
+
+
+import argparse
+import asyncio
+import ClueSolver
+import concurrent.futures
+import contextlib
+import json
+import os
+import ResultCache
+import signal
+import SimilaritySolver
+import string
+from SolutionFormat import SolutionFormat
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 30
+MAX_TIMEOUT = 300
+PENDING_REQUESTS_PER_WORKER = 4
+
+
+class SolverService:
+    """
+    Object that solves the clues of requests with a pool of worker processes.
+    At most one clue per worker is solved at a time (its subproblems are spread over all the workers), and at most
+    max_pending requests are accepted at a time (solved or waiting to be solved).
+    """
+
+    def __init__(self, workers=None, timeout=DEFAULT_TIMEOUT, max_pending=None, use_cache=True):
+        self.workers = workers or os.cpu_count()
+        self.timeout = timeout
+        self.max_pending = max_pending or PENDING_REQUESTS_PER_WORKER * self.workers
+        self.cache = ResultCache.get_cache() if use_cache else None
+        self.solved = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor = None
+        self._cancellation = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self._pending = 0
+
+    def start(self):
+        """
+        Starts the worker processes and waits until all of them are warmed up. Any missing index is built in this
+        process first, so the workers only load it.
+        """
+        ClueSolver.warm_up()
+        SimilaritySolver.load_path_cache()
+        self._cancellation = ClueSolver.Cancellation()
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=ClueSolver.init_worker,
+                                                                initargs=(False, self._cancellation))
+        concurrent.futures.wait([self._executor.submit(os.getpid) for _ in range(self.workers)])
+
+    def close(self):
+        """
+        Stops the worker processes, and keeps the path similarities they computed
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            ClueSolver.merge_worker_caches()
+            SimilaritySolver.save_path_cache()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Answers the requests sent on a connection (each in its own task, so they are solved concurrently), until the
+        client closes it
+        """
+        lock = asyncio.Lock()
+
+        async def send(response):
+            async with lock:
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await send(_error(None, "the request is too long"))
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self.handle_request(line, send))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+
+            # Answer all the requests before closing the connection
+            await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def handle_request(self, line, send):
+        """
+        Solves the clue of a single request (a line of JSON) and sends its responses
+        """
+        request_id = None
+        try:
+            request = json.loads(line)
+            if isinstance(request, dict):
+                request_id = request.get("id")
+            clue, solution_format, timeout = self._parse_request(request)
+        except (ValueError, TypeError) as e:
+            await send(_error(request_id, "illegal request: %s" % e))
+            return
+
+        if self.cache is not None:
+            solutions = self.cache.get(clue, solution_format)
+            if solutions is not None:
+                await send(_done(request_id, solutions, complete=True, cached=True))
+                return
+
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            await send(_error(request_id, "the service is busy, try again later"))
+            return
+
+        # Solutions of each subproblem, in the order of the subproblems (None until it's solved). The request stays
+        # pending until its subproblems are solved or stopped, even after it timed out.
+        results = []
+        self._pending += 1
+        task = asyncio.ensure_future(self._solve(request_id, clue, solution_format, results, send))
+        task.add_done_callback(self._request_finished)
+        try:
+            done, _ = await asyncio.wait([task], timeout=timeout)
+        finally:
+            if not task.done():
+                task.cancel()
+        complete = bool(done)
+        if complete:
+            try:
+                task.result()
+            except Exception as e:
+                # e.g. an error in a worker, or a broken pool
+                await send(_error(request_id, "the clue could not be solved: %r" % e))
+                return
+        else:
+            self.timed_out += 1
+
+        solutions = [solution for subproblem_solutions in results if subproblem_solutions is not None
+                     for solution in subproblem_solutions]
+        solutions.sort(key=lambda x: x[1], reverse=True)
+        if complete:
+            self.solved += 1
+            if self.cache is not None:
+                self.cache.put(clue, solution_format, solutions)
+        await send(_done(request_id, solutions, complete, cached=False))
+
+    async def _solve(self, request_id, clue, solution_format, results, send):
+        """
+        Parses the clue in a worker and sends its subproblems to the workers, cheapest first. The solutions of each
+        subproblem are put in the results and sent as soon as they arrive.
+        If this is cancelled (when the request timed out), the workers stop the subproblems they already started (see
+        ClueSolver.Cancellation), and the slot is kept until they stopped, so the next request doesn't wait for them.
+        """
+        async with self._slots:
+            job = self._cancellation.new_job()
+            futures = [self._executor.submit(ClueSolver.get_subproblems, clue, solution_format)]
+            waiters = [asyncio.wrap_future(futures[0])]
+            try:
+                subproblems = await waiters[0]
+                results.extend(None for _ in subproblems)
+                futures = [self._executor.submit(_solve_subproblem, subproblem, solution_format, clue, job)
+                           for subproblem in subproblems]
+                waiters = [asyncio.wrap_future(future) for future in futures]
+
+                pending = set(waiters)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for waiter in done:
+                        i = waiters.index(waiter)
+                        results[i] = waiter.result()
+                        if results[i]:
+                            await send({"id": request_id, "type": "solutions", "clue_type": subproblems[i][0],
+                                        "solutions": results[i]})
+            finally:
+                # Drop the subproblems that weren't sent to a worker yet, stop the ones that were (if the request timed
+                # out), and wait until the workers are done with them
+                self._cancellation.cancel(job)
+                for future in futures:
+                    future.cancel()
+                await asyncio.gather(*waiters, return_exceptions=True)
+
+    def _request_finished(self, task):
+        """
+        Called when the solving task of a request is done (or stopped after it timed out), to free its place
+        """
+        self._pending -= 1
+        if not task.cancelled():
+            task.exception()    # an error was already sent by the request's handler, if it was still waiting
+
+    def _parse_request(self, request):
+        """
+        Returns the clue (a list of words), the solution format (None if not given) and the timeout of a request
+        """
+        if not isinstance(request, dict):
+            raise ValueError("the request must be a JSON object")
+        if not isinstance(request.get("clue"), str):
+            raise ValueError("the request must have a clue")
+
+        # Strip punctuation and change to lower case, like CrypticSolver
+        clue_str = request["clue"].translate(str.maketrans('', '', string.punctuation))
+        clue = [word.lower() for word in clue_str.split()]
+        if not clue:
+            raise ValueError("the clue is empty")
+
+        lengths = request.get("lengths")
+        if lengths:
+            if not all(isinstance(length, int) and length > 0 for length in lengths):
+                raise ValueError("the lengths must be positive integers")
+            solution_format = SolutionFormat(len(lengths), lengths, request.get("letters") or "")
+        else:
+            solution_format = None
+
+        timeout = float(request.get("timeout", self.timeout))
+        if not timeout > 0:
+            raise ValueError("the timeout must be positive")
+
+        return clue, solution_format, min(timeout, MAX_TIMEOUT)
+
+    def __str__(self):
+        return "%s clues solved, %s timed out, %s rejected" % (self.solved, self.timed_out, self.rejected)
+
+
+def _solve_subproblem(subproblem, solution_format, clue, job):
+    """
+    Solves a single subproblem of the given job in a worker process, and returns its relevant solutions from best to
+    worst (ClueSolver.Cancelled is raised if the job is cancelled)
+    """
+    solutions = ClueSolver.solve_relevant(subproblem, solution_format, clue, job)
+    solutions.sort(key=lambda x: x[1], reverse=True)
+    return solutions
+
+
+def _done(request_id, solutions, complete, cached):
+    return {"id": request_id, "type": "done", "complete": complete, "cached": cached,
+            "solutions": [[word, score] for word, score in solutions]}
+
+
+def _error(request_id, message):
+    return {"id": request_id, "type": "error", "error": message}
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+    """
+    Starts the service and answers requests until it's stopped by Ctrl+C or SIGTERM
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in [signal.SIGINT, signal.SIGTERM]:
+        with contextlib.suppress(NotImplementedError):      # Signal handlers aren't supported on Windows
+            loop.add_signal_handler(signal_number, stop.set)
+
+    service.start()
+    try:
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(service.handle_connection, unix_path)
+            print("Listening on %s" % unix_path)
+        else:
+            server = await asyncio.start_server(service.handle_connection, host, port)
+            print("Listening on %s:%s" % (host, port))
+
+        async with server:
+            await stop.wait()
+    finally:
+        service.close()
+        print(service)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the solver as a local service. Each request is a line of JSON "
+                                                 "with a clue, and the solutions are sent back as lines of JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="host to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="TCP port to listen on (default: %(default)s)")
+    parser.add_argument("--unix", metavar="PATH",
+                        help="listen on a Unix socket in this path instead of a TCP port")
+    parser.add_argument("--workers", type=int,
+                        help="number of worker processes (default: the number of CPUs)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds to solve a clue before answering with the solutions found so far, unless the "
+                             "request sets its own timeout (default: %(default)s)")
+    parser.add_argument("--max-pending", type=int,
+                        help="number of requests that can be pending at once before new ones are rejected "
+                             "(default: %s per worker)" % PENDING_REQUESTS_PER_WORKER)
+    parser.add_argument("--no-cache", action="store_true",
+                        help="solve every clue, without looking it up in (or adding it to) the result cache")
+    args = parser.parse_args()
+
+    service = SolverService(args.workers, args.timeout, args.max_pending, not args.no_cache)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+This file holds a compact snapshot of the parts of WordNet that the solvers use while solving: the synsets of every
+lemma, the morphological exception lists and suffix rules (used to find the lemmas of inflected words), and the English
+stop words. Loading NLTK's WordNet reader parses the whole database and takes seconds, while the snapshot is a single
+pickle that loads in a fraction of that, and only on first use.
+The synsets found in the snapshot are the same (and in the same order) as the ones NLTK's wordnet.synsets returns.
+Their hypernyms (used for path similarity) are taken from the SimilarityEngine's arrays.
+The snapshot is built from NLTK's WordNet the first time it is needed. Delete it when the WordNet data changes.
+"""
+
+
+import os.path
+from nltk.corpus import wordnet as wn, stopwords
+import LemmaIndex
+
+SNAPSHOT_FILE = "wordnet_snapshot.pickle"
+
+# Parts of speech, as named in WordNet
+NOUN = "n"
+VERB = "v"
+ADJ = "a"
+ADJ_SAT = "s"
+ADV = "r"
+POS_LIST = [NOUN, VERB, ADJ, ADV]
+
+_snapshot = None
+
+
+class Synset:
+    """
+    Object that stands for a WordNet synset, by its name (e.g. "dog.n.01")
+    """
+
+    __slots__ = ["_name"]
+
+    def __init__(self, name):
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def pos(self):
+        return self._name.rsplit(".", 2)[1]
+
+    def path_similarity(self, other):
+        """
+        Returns the path similarity of this synset and the other one, as WordNet computes it (None if no path
+        connects them)
+        """
+        import SimilarityEngine
+        return SimilarityEngine.get_engine().path_similarity(self._name, other._name)
+
+    def __eq__(self, other):
+        return isinstance(other, Synset) and self._name == other._name
+
+    def __hash__(self):
+        return hash(self._name)
+
+    def __repr__(self):
+        return "Synset('%s')" % self._name
+
+
+class WordNetSnapshot:
+    """
+    Object that finds the synsets of words like NLTK's WordNet reader does
+    """
+
+    def __init__(self, data):
+        self.version = data["version"]
+        self.stop_words = frozenset(data["stop_words"])
+        self.synset_names = data["synset_names"]
+
+        # lemma -> part of speech -> ids of its synsets (in WordNet's order)
+        self.lemma_synsets = data["lemma_synsets"]
+
+        # part of speech -> irregular form -> its lemmas, and part of speech -> (suffix, ending) rules
+        self.exceptions = data["exceptions"]
+        self.substitutions = data["substitutions"]
+
+    def synsets(self, word, pos=None):
+        """
+        Returns a list of the synsets of the given word with the given part of speech (of all parts of speech if pos is
+        None). The word is also looked up by its lemmas, if it's an inflected form.
+        """
+        word = word.lower()
+        return [Synset(self.synset_names[i])
+                for p in (POS_LIST if pos is None else [pos])
+                for lemma in self._morphy(word, p)
+                for i in self.lemma_synsets[lemma][p]]
+
+    def _morphy(self, word, pos):
+        """
+        Returns the lemmas of the given word with the given part of speech: the word itself and its base forms, found
+        by the exception lists or (for regular forms) by the suffix rules, as in NLTK's WordNet reader.
+        NLTK's morphy no longer has a third step (applying the rules again until a lemma is found, removed in NLTK
+        3.9), so the word gets the same lemmas as in wn.synsets (see tests/test_WordNetSnapshot.py).
+        """
+        if word in self.exceptions[pos]:
+            forms = self.exceptions[pos][word]
+        else:
+            forms = [word[:-len(suffix)] + ending for suffix, ending in self.substitutions[pos]
+                     if word.endswith(suffix)]
+
+        lemmas = []
+        for form in [word] + forms:
+            if pos in self.lemma_synsets.get(form, ()) and form not in lemmas:
+                lemmas.append(form)
+
+        return lemmas
+
+
+def synsets(word, pos=None):
+    """
+    Returns the synsets of the given word (with the given part of speech, if any), using the (lazily loaded) snapshot
+    """
+    return get_snapshot().synsets(word, pos)
+
+
+def get_version():
+    """
+    Returns the version of WordNet the snapshot was made from
+    """
+    return get_snapshot().version
+
+
+def get_stop_words():
+    """
+    Returns the set of English stop words
+    """
+    return get_snapshot().stop_words
+
+
+def get_snapshot():
+    """
+    Returns the WordNet snapshot, loading it from the index folder (or building it if it doesn't exist yet)
+    """
+    global _snapshot
+    if _snapshot is None:
+        path = os.path.join(LemmaIndex.INDEX_FOLDER, SNAPSHOT_FILE)
+        _snapshot = WordNetSnapshot(LemmaIndex.load_or_build(path, build_snapshot))
+
+    return _snapshot
+
+
+def build_snapshot():
+    """
+    Copies the data used by the snapshot from NLTK's WordNet reader
+    """
+    synset_names = []
+    synset_ids = {}
+    for synset in wn.all_synsets():
+        # Adjective satellites are found by the adjective part of speech (they are in the same data file)
+        pos = ADJ if synset.pos() == ADJ_SAT else synset.pos()
+        synset_ids[pos, synset.offset()] = len(synset_names)
+        synset_names.append(synset.name())
+
+    lemma_synsets = {}
+    for lemma, offsets in wn._lemma_pos_offset_map.items():
+        lemma_synsets[lemma] = {pos: tuple(synset_ids[pos, offset] for offset in offsets[pos])
+                                for pos in POS_LIST if pos in offsets}
+
+    return {"version": wn.get_version(),
+            "stop_words": stopwords.words("english"),
+            "synset_names": synset_names,
+            "lemma_synsets": lemma_synsets,
+            "exceptions": {pos: dict(wn._exception_map[pos]) for pos in POS_LIST},
+            "substitutions": {pos: list(wn.MORPHOLOGICAL_SUBSTITUTIONS[pos]) for pos in POS_LIST}}
+
+
+if __name__ == "__main__":
+    print("WordNet %s snapshot: %s synsets" % (get_version(), len(get_snapshot().synset_names)))
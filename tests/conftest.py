@@ -0,0 +1,12 @@
+"""
+Lets the tests import the modules of the project (which are in its root folder), and run them from the root folder,
+since the modules open the word lists, the clues and the indexes by relative paths
+"""
+
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,42 @@
+import os
+import pytest
+import ClueParser
+import ClueSolver
+import GrammarDefinitions
+import Instrumentation
+from SolveFromFile import FOLDER, parse_file
+
+
+def _clues(file_name):
+    with open(os.path.join(FOLDER, file_name), encoding="utf-8") as f:
+        return [clue for clue, _, _ in parse_file(f)]
+
+
+CLUES = _clues("ClueList.txt")
+
+
+def test_clue_list_is_complete():
+    assert len(CLUES) == 146
+
+
+@pytest.mark.parametrize("clue", CLUES, ids=[" ".join(clue) for clue in CLUES])
+def test_parser_finds_the_subproblems_of_the_grammar(clue):
+    assert set(ClueParser.parse(clue)) == set(ClueSolver.get_tree_subproblems(clue))
+
+
+@pytest.mark.parametrize("clue", CLUES, ids=[" ".join(clue) for clue in CLUES])
+def test_trees_collapsed_counts_the_repeated_trees(clue):
+    # Every way the parser splits the clue stands for one parse tree (with one choice of abbreviations)
+    trees = [abbreviated_tree for tree in GrammarDefinitions.get_parser(clue).parse(clue)
+             for abbreviated_tree in ClueSolver._handle_abbreviations(tree)]
+
+    Instrumentation.enable()
+    try:
+        Instrumentation.start_clue(clue)
+        subproblems = ClueParser.parse(clue)
+        Instrumentation.end_clue()
+        record, = Instrumentation.take_records()
+    finally:
+        Instrumentation.disable()
+
+    assert record["counts"]["trees_collapsed"] == len(trees) - len(subproblems)
@@ -0,0 +1,80 @@
+import collections
+import pytest
+import LemmaIndex
+from SolutionFormat import SolutionFormat
+
+
+@pytest.fixture(scope="module")
+def trie():
+    return LemmaIndex.get_trie()
+
+
+def _fits(phrase, word, lengths):
+    return (tuple(len(part) for part in phrase.split(" ")) == tuple(lengths) and
+            collections.Counter(phrase.replace(" ", "")) == collections.Counter(word))
+
+
+def test_single_words(trie):
+    phrases = trie.anagram_phrases("tsen", [4])
+    assert {"nest", "sent", "tens"} <= set(phrases)
+    assert all(_fits(phrase, "tsen", [4]) for phrase in phrases)
+
+
+def test_multi_word_format(trie):
+    phrases = trie.anagram_phrases("sevendeadlysins", [5, 6, 4])
+    assert "seven deadly sins" in phrases
+    assert len(phrases) == len(set(phrases))
+    assert all(_fits(phrase, "sevendeadlysins", [5, 6, 4]) for phrase in phrases)
+
+
+def test_known_letters(trie):
+    solution_format = SolutionFormat(3, [5, 6, 4], "s____ _e____ ___s")
+    phrases = trie.anagram_phrases("sevendeadlysins", solution_format.lengths, solution_format.letters)
+    assert "seven deadly sins" in phrases
+    assert all(phrase[0] == "s" and phrase[7] == "e" and phrase[-1] == "s" for phrase in phrases)
+    assert set(phrases) < set(trie.anagram_phrases("sevendeadlysins", [5, 6, 4]))
+
+
+def test_known_letters_in_upper_case(trie):
+    assert trie.anagram_phrases("creamice", [3, 5], {(1, 0): "C"}) == \
+        trie.anagram_phrases("creamice", [3, 5], {(1, 0): "c"})
+
+
+def test_only_real_words(trie):
+    # The suffix rules alone also make forms that aren't words
+    assert "goed" not in trie.anagram_phrases("goed", [4])
+    assert "hopeing" not in trie.anagram_phrases("hopeing", [7])
+    assert "sins" in trie.anagram_phrases("sins", [4])
+    assert "geese" in trie.anagram_phrases("geese", [5])
+
+
+def test_limit(trie):
+    assert trie.anagram_phrases("sevendeadlysins", [5, 6, 4], limit=10) == \
+        trie.anagram_phrases("sevendeadlysins", [5, 6, 4])[:10]
+
+
+def test_letters_that_do_not_fit(trie):
+    assert trie.anagram_phrases("tsen", [5]) == []
+    assert trie.anagram_phrases("tsen", [2, 3]) == []
+    assert trie.anagram_phrases("ts3n", [4]) == []
+
+
+def test_spaces_and_punctuation_are_ignored(trie):
+    assert trie.anagram_phrases("ice-cream", [3, 5]) == trie.anagram_phrases("icecream", [3, 5])
+
+
+def test_max_nodes_bounds_the_walk(trie):
+    phrases = trie.anagram_phrases("tearsinrestaurant", [3, 3, 3, 4, 4], max_nodes=20000)
+    assert 0 < len(phrases) < len(trie.anagram_phrases("tearsinrestaurant", [3, 3, 3, 4, 4], max_nodes=40000))
+    assert all(_fits(phrase, "tearsinrestaurant", [3, 3, 3, 4, 4]) for phrase in phrases)
+
+
+def test_check_can_stop_the_walk(trie):
+    class Stop(Exception):
+        pass
+
+    def check():
+        raise Stop()
+
+    with pytest.raises(Stop):
+        trie.anagram_phrases("tearsinrestaurant", [3, 3, 3, 4, 4], check=check)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import LemmaVectors
+import SimilarityEngine
+import WordNetSnapshot
+
+CLUES = ["bird", "a number of faults", "frozen dessert", "stormy sea"]
+PATTERNS = [(4,), (7,), (3, 5), (5, 6, 4)]
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return LemmaVectors.get_vectors()
+
+
+def _synsets(clue):
+    return [synset for word in clue.split() for synset in WordNetSnapshot.synsets(word)]
+
+
+def _exact_nearest(vectors, synsets, count, lemma_ids):
+    """
+    Returns the ids of the lemmas with the count highest scores, and the ids of the ones tied with the last of them
+    """
+    scores = vectors.lemma_vectors[vectors.lemma_rows[lemma_ids]] @ vectors.clue_vector(synsets)
+    if len(scores) <= count:
+        return set(lemma_ids), set()
+    threshold = np.sort(scores)[-count]
+    return set(lemma_ids[scores > threshold]), set(lemma_ids[scores == threshold])
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+@pytest.mark.parametrize("clue", CLUES)
+def test_search_with_lemma_ids_is_exact(vectors, clue, pattern):
+    lemma_ids = SimilarityEngine.get_engine().lemma_ids(pattern=pattern)
+    count = 50
+    nearest = set(vectors.nearest_lemmas([_synsets(clue)], count, lemma_ids))
+
+    above, tied = _exact_nearest(vectors, _synsets(clue), count, lemma_ids)
+    assert len(nearest) == min(count, len(lemma_ids))
+    assert above <= nearest <= above | tied
+
+
+def test_search_of_several_clues_is_the_union(vectors):
+    lemma_ids = SimilarityEngine.get_engine().lemma_ids(pattern=(4,))
+    clues = [_synsets("bird"), _synsets("frozen dessert")]
+    nearest = vectors.nearest_lemmas(clues, 30, lemma_ids)
+
+    assert list(nearest) == sorted(set(nearest))
+    assert set(nearest) == set(vectors.nearest_lemmas(clues[:1], 30, lemma_ids)) | \
+        set(vectors.nearest_lemmas(clues[1:], 30, lemma_ids))
+
+
+def test_fewer_lemma_ids_than_count(vectors):
+    lemma_ids = SimilarityEngine.get_engine().lemma_ids(pattern=(4,))[:10]
+    assert set(vectors.nearest_lemmas([_synsets("bird")], 50, lemma_ids)) == set(lemma_ids)
+
+
+def test_clue_without_synsets(vectors):
+    assert len(vectors.nearest_lemmas([[]], 50)) == 0
+
+
+def test_nearest_phrases_puts_the_meaning_first(vectors):
+    phrases = ["sides delays venn", "seven deadly sins", "salve sidney ends"]
+    assert vectors.nearest_phrases(_synsets("a number of faults"), phrases, 1) == ["seven deadly sins"]
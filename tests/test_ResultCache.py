@@ -0,0 +1,106 @@
+import itertools
+import shutil
+import pytest
+import Lexicon
+import ResultCache
+from SolutionFormat import SolutionFormat
+
+CLUE = ["bird", "returned", "to", "the", "nest"]
+SOLUTIONS = [("tern", 0.5), ("nest", 0.25)]
+
+
+@pytest.fixture
+def word_lists(tmp_path, monkeypatch):
+    """
+    A copy of the word lists, used by the Lexicon instead of the real ones
+    """
+    folder = tmp_path / "Word lists"
+    shutil.copytree(Lexicon.FOLDER, folder)
+    monkeypatch.setattr(Lexicon, "FOLDER", str(folder))
+    return folder
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Makes the cache see a later time on every call, so the order of use is always clear
+    """
+    ticks = itertools.count()
+    monkeypatch.setattr(ResultCache.time, "time", lambda: float(next(ticks)))
+
+
+@pytest.fixture
+def path(tmp_path, word_lists):
+    return str(tmp_path / "results.sqlite")
+
+
+def test_put_and_get(path):
+    cache = ResultCache.ResultCache(path)
+    solution_format = SolutionFormat(1, [4], "")
+    assert cache.get(CLUE, solution_format) is None
+
+    cache.put(CLUE, solution_format, SOLUTIONS)
+    assert cache.get(CLUE, solution_format) == SOLUTIONS
+    assert cache.get(CLUE, None) is None
+    assert cache.get(CLUE, SolutionFormat(1, [4], "t___")) is None
+    assert (cache.hits, cache.misses, len(cache)) == (1, 3, 1)
+
+
+def test_solutions_persist(path):
+    cache = ResultCache.ResultCache(path)
+    cache.put(CLUE, None, SOLUTIONS)
+    cache.close()
+
+    assert ResultCache.ResultCache(path).get(CLUE, None) == SOLUTIONS
+
+
+def test_least_recently_used_clues_are_evicted(path, clock):
+    cache = ResultCache.ResultCache(path, max_entries=2)
+    cache.put(["first"], None, SOLUTIONS)
+    cache.put(["second"], None, SOLUTIONS)
+    assert cache.get(["first"], None) == SOLUTIONS     # the second clue is now the least recently used
+
+    cache.put(["third"], None, SOLUTIONS)
+    assert len(cache) == 2
+    assert cache.get(["second"], None) is None
+    assert cache.get(["first"], None) == SOLUTIONS
+    assert cache.get(["third"], None) == SOLUTIONS
+
+    # Replacing a cached clue doesn't evict anything
+    cache.put(["third"], None, SOLUTIONS[:1])
+    assert len(cache) == 2
+    assert cache.get(["first"], None) == SOLUTIONS
+
+
+def test_cache_is_emptied_when_word_lists_change(path, word_lists):
+    cache = ResultCache.ResultCache(path)
+    cache.put(CLUE, None, SOLUTIONS)
+    cache.close()
+
+    with open(word_lists / "REV_IDT.txt", "a", encoding="utf-8") as f:
+        f.write("\nturned around")
+
+    cache = ResultCache.ResultCache(path)
+    assert len(cache) == 0
+    assert cache.get(CLUE, None) is None
+
+
+def test_cache_is_kept_when_word_lists_stay_the_same(path):
+    cache = ResultCache.ResultCache(path)
+    cache.put(CLUE, None, SOLUTIONS)
+    cache.close()
+
+    assert len(ResultCache.ResultCache(path)) == 1
+
+
+def test_cache_is_emptied_when_cache_version_changes(path, monkeypatch):
+    cache = ResultCache.ResultCache(path)
+    cache.put(CLUE, None, SOLUTIONS)
+    cache.close()
+
+    monkeypatch.setattr(ResultCache, "CACHE_VERSION", ResultCache.CACHE_VERSION + 1)
+    assert ResultCache.ResultCache(path).get(CLUE, None) is None
+
+
+def test_key_normalizes_clue():
+    assert ResultCache.get_key(["Bird", "", "Nest"], None) == ResultCache.get_key(["bird", "nest"], None)
@@ -0,0 +1,58 @@
+import pytest
+import SimilarityEngine
+import SimilaritySolver
+
+CLUES = ["bird", "a number of faults", "frozen dessert", "stormy sea"]
+SLICES = [(4, None), (7, None), (0, (3, 5)), (0, (5,))]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return SimilarityEngine.get_engine()
+
+
+def _names(engine, length, pattern):
+    return [engine.lemma_names[i] for i in engine.lemma_ids(length, pattern)]
+
+
+def _reference_scores(names, context):
+    """
+    Returns the total scores of the given lemmas as solutions to the clue of the context, as SimilaritySolver scores
+    them one by one
+    """
+    return SimilaritySolver._combine_scores(*SimilaritySolver._give_score(names, 0, context))
+
+
+@pytest.mark.parametrize("length, pattern", SLICES)
+@pytest.mark.parametrize("clue", CLUES)
+def test_top_scores_are_the_solver_scores(engine, clue, length, pattern):
+    context = SimilaritySolver.ClueContext(clue)
+    names = _names(engine, length, pattern)
+    reference = _reference_scores(names, context)
+    top = engine.top_scores(context, length, len(names), pattern)
+
+    assert [score for _, score in top] == sorted((score for _, score in top), reverse=True)
+    assert dict(top) == pytest.approx({name: score for name, score in reference.items() if score > 0})
+
+
+@pytest.mark.parametrize("clue", CLUES)
+def test_top_scores_keeps_the_best_k(engine, clue):
+    context = SimilaritySolver.ClueContext(clue)
+    reference = _reference_scores(_names(engine, 4, None), context)
+    top = engine.top_scores(context, 4, 50)
+
+    scores = sorted(reference.values(), reverse=True)[:50]
+    assert [score for _, score in top] == pytest.approx(scores)
+    assert all(reference[name] >= scores[-1] - 1e-9 for name, _ in top)
+
+
+def test_top_products_are_the_products_of_the_solver_scores(engine):
+    first_context = SimilaritySolver.ClueContext("bird")
+    second_context = SimilaritySolver.ClueContext("drink")
+    candidates = engine.lemma_ids(4)[::10]
+    names = [engine.lemma_names[i] for i in candidates]
+    first, second = _reference_scores(names, first_context), _reference_scores(names, second_context)
+    top = engine.top_products(first_context, second_context, 4, len(names), candidates=candidates)
+
+    assert dict(top) == pytest.approx({name: first[name] * second[name] for name in names
+                                       if first.get(name, 0) * second.get(name, 0) > 0})
@@ -0,0 +1,34 @@
+import glob
+import os
+import re
+import pytest
+import WordNetSnapshot
+from nltk.corpus import wordnet as wn
+
+
+def _clue_words():
+    """
+    Returns the set of all the words in the clue files (clues and solutions)
+    """
+    words = set()
+    for path in glob.glob(os.path.join("Clues", "*.txt")):
+        with open(path, encoding="utf-8") as f:
+            words.update(re.findall(r"[a-z]+(?:['-][a-z]+)*", f.read().lower()))
+    return words
+
+
+@pytest.mark.parametrize("pos", [None, wn.NOUN, wn.VERB, wn.ADJ, wn.ADV])
+def test_synsets_match_wordnet_on_clue_words(pos):
+    # The snapshot's morphy must find the same lemmas as NLTK's (including the exceptions and the original form)
+    different = [word for word in sorted(_clue_words())
+                 if [synset.name() for synset in WordNetSnapshot.synsets(word, pos)] !=
+                 [synset.name() for synset in wn.synsets(word, pos)]]
+    assert different == []
+
+
+def test_synsets_of_inflected_and_irregular_forms():
+    assert [synset.name() for synset in WordNetSnapshot.synsets("geese")] == \
+        [synset.name() for synset in wn.synsets("geese")]
+    assert "goose.n.01" in [synset.name() for synset in WordNetSnapshot.synsets("geese", wn.NOUN)]
+    assert "run.v.01" in [synset.name() for synset in WordNetSnapshot.synsets("ran", wn.VERB)]
+    assert WordNetSnapshot.synsets("xyzzyq") == []